@@ -3,7 +3,7 @@ from setuptools import setup, find_packages
 setup(name='tyto',
       version='1.4',
       description='Automatically generates Python symbols for ontology terms',
-      python_requires='>=3.6',
+      python_requires='>=3.7',
       url='https://github.com/SynBioDex/tyto',
       author='Bryan Bartley',
       author_email='bartleyba@sbolstandard.org',
@@ -30,7 +30,9 @@ setup(name='tyto',
       keywords='ontologies',
       packages=find_packages(),
       package_data={'tyto': ['ontologies/*.owl',
+                              'ontologies/*.owl.gz',
                               'ontologies/*.rdf',
+                              'ontologies/*.rdf.gz',
                               'ontologies/*.ttl',
                               'ontologies/sbol-owl3/sbolowl3.rdf',
                               'ontologies/sbol-owl/sbol.rdf',
@@ -38,11 +40,15 @@ setup(name='tyto',
                               'ontologies/paml/uml/uml.ttl']},
       include_package_data=True,
       install_requires=[
-            'rdflib>=5.0',
-            'SPARQLWrapper',
-            'requests',
-            'pyparsing<3'  # See https://github.com/RDFLib/rdflib/issues/1190
+            'rdflib>=6.0',
+            'requests'
       ],
+      extras_require={
+            # Parse local ontologies with the Rust-backed Oxigraph store
+            'oxigraph': ['oxrdflib>=0.4'],
+            # Decode large query results with a faster JSON parser
+            'orjson': ['orjson']
+      },
       test_suite='test',
       tests_require=[
             'pycodestyle>=2.6.0'
@@ -1,8 +1,40 @@
 import unittest
+import unittest.mock
+import concurrent.futures
+import gzip
+import itertools
+import json
+import time
 import os
+import shutil
+import sys
+import tempfile
+import threading
+
+import rdflib
+import requests
 
 from tyto import *
-from tyto.endpoint import EBIOntologyLookupService
+from tyto.endpoint import (EBIOntologyLookupService, GraphEndpoint, SPARQLEndpoint, QueryBackend, CachedSession,
+                           DiskCache, TermIndex, AmbiguousTermError, EndpointRequestError, LOOKUP_CACHE)
+
+
+_CACHE_DIR = None
+_CACHE_ENVIRONMENT = None
+
+
+def setUpModule():
+    # Lookups and HTTP responses are cached on disk for a week, so the tests use a cache
+    # of their own, rather than leaving mocked results in the user's ~/.cache/tyto
+    global _CACHE_DIR, _CACHE_ENVIRONMENT
+    _CACHE_DIR = tempfile.TemporaryDirectory()
+    _CACHE_ENVIRONMENT = unittest.mock.patch.dict(os.environ, {'TYTO_CACHE_DIR': _CACHE_DIR.name})
+    _CACHE_ENVIRONMENT.start()
+
+
+def tearDownModule():
+    _CACHE_ENVIRONMENT.stop()
+    _CACHE_DIR.cleanup()
 
 
 class TestOntology(unittest.TestCase):
@@ -128,6 +160,778 @@ class TestOntology(unittest.TestCase):
         ContO = Ontology(path=test_ontology, uri='https://sift.net/container-ontology/container-ontology')
         assert len(ContO['96 well plate'].get_instances()) == 2
 
+    def test_prepared_queries(self):
+        # Queries are parsed once and reused, so a URI bound in one call must not
+        # leak into the next
+        test_ontology = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'container-ontology.ttl')
+        ContO = Ontology(path=test_ontology, uri='https://sift.net/container-ontology/container-ontology')
+        plate = ContO['96 well plate']
+        instances = plate.get_instances()
+        self.assertFalse(plate.is_instance())
+        self.assertTrue(all(URI(instance, ContO).is_instance() for instance in instances))
+        self.assertFalse(plate.is_instance())
+
+    def test_cache(self):
+        # Repeated lookups should be served from the in-memory cache
+        test_ontology = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'container-ontology.ttl')
+        ContO = Ontology(path=test_ontology, uri='https://sift.net/container-ontology/container-ontology')
+        uri = ContO.get_uri_by_term('coating')
+        hits = Ontology.get_uri_by_term.cache_info().hits
+        self.assertEqual(ContO.get_uri_by_term('coating'), uri)
+        self.assertEqual(Ontology.get_uri_by_term.cache_info().hits, hits + 1)
+
+    def test_cache_size(self):
+        # Resizing the cache keeps the most recently used entries
+        test_ontology = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'container-ontology.ttl')
+        ContO = Ontology(path=test_ontology, uri='https://sift.net/container-ontology/container-ontology')
+        ContO.get_uri_by_term('96 well plate')
+        ContO.get_uri_by_term('coating')
+        try:
+            configure_cache_size(1)
+            self.assertEqual(Ontology.get_uri_by_term.cache_info().currsize, 1)
+            hits = Ontology.get_uri_by_term.cache_info().hits
+            ContO.get_uri_by_term('coating')
+            self.assertEqual(Ontology.get_uri_by_term.cache_info().hits, hits + 1)
+        finally:
+            configure_cache_size()
+        self.assertEqual(Ontology.get_uri_by_term.cache_info().maxsize, 1000)
+
+    def test_unbounded_cache(self):
+        try:
+            configure_cache_size(None)
+            currsize = Ontology.get_uri_by_term.cache_info().currsize
+            ContO = Ontology(path=os.path.join(os.path.dirname(os.path.realpath(__file__)), 'container-ontology.ttl'))
+            for term in ('96 well plate', 'coating'):
+                ContO.get_uri_by_term(term)
+            self.assertEqual(Ontology.get_uri_by_term.cache_info().currsize, currsize + 2)
+            self.assertIsNone(Ontology.get_uri_by_term.cache_info().maxsize)
+        finally:
+            configure_cache_size()
+
+    def test_disk_cache_location(self):
+        # Lookups and parsed ontologies are cached in the configured directory
+        test_ontology = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'container-ontology.ttl')
+        with tempfile.TemporaryDirectory() as cache_dir:
+            try:
+                configure_disk_cache(cache_dir, ttl=60)
+                self.assertEqual(LOOKUP_CACHE.expire_after, 60)
+                ContO = Ontology(path=test_ontology, uri='https://sift.net/container-ontology/container-ontology')
+                ContO.get_uri_by_term('well')
+                self.assertTrue(os.path.exists(os.path.join(cache_dir, 'lookups.sqlite')))
+            finally:
+                configure_disk_cache()
+        self.assertEqual(LOOKUP_CACHE.expire_after, 7 * 24 * 60 * 60)
+
+    def test_warm_cache(self):
+        test_ontology = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'container-ontology.ttl')
+        ContO = Ontology(path=test_ontology, uri='https://sift.net/container-ontology/container-ontology')
+        warm_cache(ContO, ['coating', 'not_a_term']).join()
+        hits = Ontology.get_uri_by_term.cache_info().hits
+        ContO.get_uri_by_term('coating')
+        self.assertEqual(Ontology.get_uri_by_term.cache_info().hits, hits + 1)
+
+    def test_warm_cache_batch(self):
+        # The terms are resolved with one batch query, whose results are cached
+        class Backend(QueryBackend):
+            def get_term_by_uri(self, ontology, uri):
+                return None
+            def get_uri_by_term(self, ontology, term):
+                return None
+            def get_uris_by_terms(self, ontology, terms):
+                return {term: f'http://example.org/{term}' for term in terms if term != 'missing'}
+        backend = Backend()
+        ontology = Ontology(endpoints=[backend])
+        with unittest.mock.patch.object(backend, 'get_uri_by_term', return_value=None) as get:
+            warm_cache(ontology, ['a', 'b', 'missing']).join()
+            # Only the term the batch didn't find is looked up individually
+            self.assertEqual(get.call_count, 1)
+            self.assertEqual(ontology.a, 'http://example.org/a')
+            self.assertEqual(get.call_count, 1)
+
+    def test_warm_cache_from_environment(self):
+        # A malformed TYTO_WARM file, or an ontology that can't be set up, doesn't fail the import
+        def set_up(name):
+            if name == 'Unreachable':
+                raise requests.ConnectionError('unreachable')
+            if name == 'Missing':
+                raise LookupError('no such ontology')
+            raise AttributeError(name)
+        package = sys.modules['tyto']
+        with tempfile.TemporaryDirectory() as warm_dir:
+            path = os.path.join(warm_dir, 'warm.json')
+            for config in (['SO'], {'SO': 'promoter'}, {'Unreachable': ['a'], 'Missing': ['b'], 'Unknown': ['c']}):
+                with open(path, 'w') as f:
+                    json.dump(config, f)
+                with unittest.mock.patch.dict(os.environ, {'TYTO_WARM': path}), \
+                        unittest.mock.patch('tyto.__getattr__', side_effect=set_up), \
+                        unittest.mock.patch('tyto.warm_cache') as warm, \
+                        self.assertLogs('tyto', 'WARNING'):
+                    package._warm_cache_from_environment()
+                    warm.assert_not_called()
+
+    def test_relation_cache(self):
+        # The children of a term are queried once, then reused for other candidates
+        graph = SPARQLEndpoint('http://example.org/sparql')
+        response = [('http://parent', 'http://a'), ('http://parent', 'http://b')]
+        with unittest.mock.patch.object(graph, 'query_rows', return_value=response) as query:
+            self.assertTrue(graph.is_child_of(None, 'http://a', 'http://parent'))
+            self.assertTrue(graph.is_child_of(None, 'http://b', 'http://parent'))
+            self.assertFalse(graph.is_child_of(None, 'http://c', 'http://parent'))
+            self.assertEqual(query.call_count, 1)
+
+    def test_is_descendant_of(self):
+        # Descendant checks are answered without listing the descendants
+        test_ontology = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'container-ontology.ttl')
+        ContO = Ontology(path=test_ontology, uri='https://sift.net/container-ontology/container-ontology')
+        plate = ContO['96 well plate']
+        parent = next(iter(ContO.graph.get_parents_batch(ContO, [plate])[plate]))
+        self.assertTrue(ContO.graph.is_descendant_of(ContO, plate, parent))
+        self.assertFalse(ContO.graph.is_descendant_of(ContO, parent, plate))
+        # Local graphs answer from their class hierarchy, read once
+        with unittest.mock.patch.object(GraphEndpoint, 'query') as query:
+            self.assertTrue(ContO.graph.is_ancestor_of(ContO, parent, plate))
+            self.assertFalse(ContO.graph.is_ancestor_of(ContO, plate, parent))
+            self.assertTrue(ContO.graph.is_descendant_of(ContO, plate, plate))
+            self.assertTrue(ContO.graph.is_child_of(ContO, plate, parent))
+            self.assertTrue(ContO.graph.is_parent_of(ContO, parent, plate))
+            self.assertFalse(ContO.graph.is_child_of(ContO, parent, plate))
+            query.assert_not_called()
+        # Remote endpoints are sent an ASK query
+        response = {'head': {}, 'boolean': True}
+        self.assertIs(SPARQLEndpoint('http://example.org/sparql').convert(response), True)
+
+    def test_cache_stats(self):
+        graph = SPARQLEndpoint('http://example.org/sparql')
+        hits = cache_stats()['relations'].hits
+        with unittest.mock.patch.object(graph, 'query_rows', return_value=[]):
+            graph.is_child_of(None, 'http://a', 'http://parent')
+            graph.is_child_of(None, 'http://b', 'http://parent')
+        self.assertEqual(cache_stats()['relations'].hits, hits + 1)
+        self.assertIn('get_uri_by_term', cache_stats())
+
+    def test_prefetch(self):
+        # Relations of prefetched terms are fetched in a batch, then looked up locally
+        test_ontology = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'container-ontology.ttl')
+        ContO = Ontology(path=test_ontology, uri='https://sift.net/container-ontology/container-ontology')
+        plate = ContO['96 well plate']
+        parents = ContO.graph.get_parents_batch(ContO, [plate])[plate]
+        self.assertTrue(parents)
+        parent = URI(next(iter(parents)), ContO)
+        # The local graph answers from its class hierarchy, so there is nothing to prefetch
+        with unittest.mock.patch.object(GraphEndpoint, 'query_rows') as query_rows:
+            ContO.prefetch([plate, parent])
+            ContO.graph.prefetch(ContO, [plate, parent])
+            query_rows.assert_not_called()
+        with unittest.mock.patch.object(GraphEndpoint, 'query') as query:
+            self.assertTrue(plate.is_child_of(parent))
+            self.assertTrue(parent.is_parent_of(plate))
+            self.assertFalse(parent.is_child_of(plate))
+            query.assert_not_called()
+
+    def test_prefetch_doesnt_parse(self):
+        # Endpoints that can't prefetch don't make the local ontology be parsed instead
+        with tempfile.TemporaryDirectory() as cache_dir:
+            # A copy of the ontology, so that no other test has loaded its graph
+            test_ontology = os.path.join(cache_dir, 'container-ontology.ttl')
+            shutil.copy(os.path.join(os.path.dirname(os.path.realpath(__file__)), 'container-ontology.ttl'),
+                        test_ontology)
+            ols = type(EBIOntologyLookupService)()
+            ContO = Ontology(path=test_ontology, endpoints=[ols])
+            with unittest.mock.patch.object(ols, 'prefetch', return_value=None) as prefetch:
+                ContO.prefetch(['https://sift.net/container-ontology/container-ontology#coating'])
+                prefetch.assert_called_once()
+            self.assertFalse(ContO.graph.is_loaded())
+
+    def test_attribute_cache(self):
+        # Terms accessed as attributes are stored on the instance
+        test_ontology = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'container-ontology.ttl')
+        ContO = Ontology(path=test_ontology, uri='https://sift.net/container-ontology/container-ontology')
+        uri = ContO.coating
+        with unittest.mock.patch.object(Ontology, 'get_uri_by_term') as get_uri_by_term:
+            self.assertEqual(ContO.coating, uri)
+            get_uri_by_term.assert_not_called()
+        with self.assertRaises(AttributeError):
+            ContO.__length_hint__
+        with unittest.mock.patch.object(Ontology, 'get_uri_by_term') as get_uri_by_term:
+            self.assertFalse(hasattr(ContO, '_repr_html_'))
+            get_uri_by_term.assert_not_called()
+
+    def test_negative_cache(self):
+        # A failed lookup is cached, so it isn't dispatched again
+        test_ontology = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'container-ontology.ttl')
+        ContO = Ontology(path=test_ontology, uri='https://sift.net/container-ontology/container-ontology')
+        with self.assertRaises(LookupError):
+            ContO.not_a_term
+        with unittest.mock.patch.object(Ontology, '_handler') as handler:
+            with self.assertRaises(LookupError):
+                ContO.not_a_term
+            handler.assert_not_called()
+
+    def test_label_index(self):
+        # Term lookups on a local graph are answered from a label index, not SPARQL
+        test_ontology = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'container-ontology.ttl')
+        ContO = Ontology(path=test_ontology, uri='https://sift.net/container-ontology/container-ontology')
+        uri = ContO['96 well plate']
+        with unittest.mock.patch.object(GraphEndpoint, 'query') as query:
+            self.assertEqual(ContO['96_Well_PLATE'], uri)
+            self.assertEqual(ContO.get_term_by_uri(uri), '96 well plate')
+            query.assert_not_called()
+
+    def test_uri_prefixes(self):
+        # URIs from another ontology are rejected without querying the endpoints
+        with unittest.mock.patch.object(Ontology, '_query_endpoints') as query_endpoints:
+            with self.assertRaises(LookupError):
+                SO.get_term_by_uri('https://identifiers.org/pubchem.substance:24866361')
+            query_endpoints.assert_not_called()
+        ontology = Ontology(endpoints=[Ontobee], uri_prefixes=['http://example.org/'])
+        with unittest.mock.patch.object(Ontology, '_handler') as handler:
+            with self.assertRaises(LookupError):
+                ontology.get_term_by_uri('https://identifiers.org/pubchem.substance:24866361')
+            handler.assert_not_called()
+        # The local graph still labels terms outside the prefixes of its term ids
+        self.assertEqual(SO.get_term_by_uri(SO.part_of), 'part_of')
+        self.assertEqual(SBO.get_term_by_uri('http://biomodels.net/SBO/part_of'), 'part of')
+
+    def test_build_cache(self):
+        # Terms in a saved snapshot are looked up without querying the back-ends
+        test_ontology = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'container-ontology.ttl')
+        uri = 'https://sift.net/container-ontology/container-ontology'
+        class Backend(QueryBackend):
+            def get_term_by_uri(self, ontology, uri):
+                raise AssertionError('The snapshot was not used')
+            def get_uri_by_term(self, ontology, term):
+                raise AssertionError('The snapshot was not used')
+        with tempfile.TemporaryDirectory() as cache_dir:
+            with unittest.mock.patch.dict(os.environ, {'TYTO_CACHE_DIR': cache_dir}):
+                self.assertGreater(Ontology(path=test_ontology, uri=uri).build_cache(), 0)
+                ContO = Ontology(endpoints=[Backend()], uri=uri)
+                plate = ContO['96 well plate']
+                self.assertEqual(ContO.get_term_by_uri(plate), '96 well plate')
+                self.assertEqual(ContO.get_uris_by_terms(['coating']), {'coating': ContO.coating})
+
+    def test_failed_cache_write(self):
+        # A snapshot that fails to be written is logged, and leaves no temporary file behind
+        ontology = Ontology(endpoints=[Ontobee], uri='http://example.org/ontology')
+        with tempfile.TemporaryDirectory() as cache_dir:
+            with unittest.mock.patch.dict(os.environ, {'TYTO_CACHE_DIR': cache_dir}):
+                with unittest.mock.patch('pickle.dump', side_effect=OSError('disk full')):
+                    with self.assertLogs('tyto.endpoint.endpoint', 'WARNING'):
+                        TermIndex([('http://example.org/a', 'a')]).save(ontology)
+                self.assertEqual(os.listdir(os.path.join(cache_dir, 'terms')), [])
+                self.assertIsNone(TermIndex.load(ontology))
+
+    def test_get_uris_by_terms(self):
+        test_ontology = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'container-ontology.ttl')
+        ContO = Ontology(path=test_ontology, uri='https://sift.net/container-ontology/container-ontology')
+        uris = ContO.get_uris_by_terms(['96_well_plate', 'coating', 'not_a_term'])
+        self.assertEqual(uris, {'96_well_plate': ContO['96 well plate'],
+                                'coating': ContO.coating})
+        self.assertTrue(all(type(uri) is URI for uri in uris.values()))
+        # The URIs found are cached for single lookups, and vice versa
+        hits = Ontology.get_uri_by_term.cache_info().hits
+        ContO.get_uri_by_term('96_well_plate')
+        self.assertEqual(Ontology.get_uri_by_term.cache_info().hits, hits + 1)
+        with unittest.mock.patch.object(Ontology, '_handler') as handler:
+            self.assertEqual(ContO.get_uris_by_terms(['coating', 'not_a_term']), {'coating': ContO.coating})
+            handler.assert_not_called()
+
+    def test_concurrent_lookups(self):
+        class Backend(QueryBackend):
+            def get_term_by_uri(self, ontology, uri):
+                return None
+            def get_uri_by_term(self, ontology, term):
+                return None if term == 'not_a_term' else f'http://example.org/{term}'
+        try:
+            configure_concurrency(4)
+            uris = Backend().get_uris_by_terms(None, ['a', 'b', 'not_a_term', 'c'])
+        finally:
+            configure_concurrency()
+        self.assertEqual(uris, {t: f'http://example.org/{t}' for t in 'abc'})
+
+    def test_ols_batch(self):
+        # The relations of several terms are requested concurrently, one request per term.
+        # Each request waits for all of them to be in flight, which times out unless they are
+        ols = type(EBIOntologyLookupService)()
+        in_flight = threading.Barrier(4, timeout=5)
+        def get_related_terms(ontology, relation, uri):
+            in_flight.wait()
+            return frozenset([f'{uri}/{relation}'])
+        with unittest.mock.patch.object(ols, '_get_related_terms', side_effect=get_related_terms) as get_related:
+            try:
+                configure_concurrency(4)
+                ancestors = ols.get_ancestors_batch(None, ['http://a', 'http://b', 'http://c', 'http://d'])
+            finally:
+                configure_concurrency()
+        self.assertEqual(ancestors['http://c'], {'http://c/ancestors'})
+        self.assertEqual(get_related.call_count, 4)
+
+    def test_concurrent_endpoints(self):
+        # With concurrency enabled, the endpoints are queried at once, so a slow endpoint
+        # doesn't delay the next one's answer, but the first endpoint's answer is preferred
+        class Backend(QueryBackend):
+            def __init__(self, uri, wait=None, done=None):
+                self.uri = uri
+                self.wait = wait
+                self.done = done
+            def get_term_by_uri(self, ontology, uri):
+                return None
+            def get_uri_by_term(self, ontology, term):
+                if self.wait is not None:
+                    self.wait()
+                if self.done is not None:
+                    self.done.set()
+                return self.uri
+        try:
+            configure_concurrency(4)
+            # Each endpoint waits for the other to be queried, which times out unless they are queried at once
+            in_flight = threading.Barrier(2, timeout=5)
+            ontology = Ontology(endpoints=[Backend(None, in_flight.wait), Backend('http://example.org/b', in_flight.wait)])
+            self.assertEqual(ontology.get_uri_by_term('b'), 'http://example.org/b')
+            # The second endpoint answers first
+            answered = threading.Event()
+            ontology = Ontology(endpoints=[Backend('http://example.org/a', lambda: answered.wait(5)),
+                                           Backend('http://example.org/b', done=answered)])
+            # The lookups share the thread pool made by configure_concurrency
+            with unittest.mock.patch('tyto.tyto.ThreadPoolExecutor') as executor:
+                self.assertEqual(ontology.get_uri_by_term('a'), 'http://example.org/a')
+                executor.assert_not_called()
+        finally:
+            configure_concurrency()
+
+    def test_reconfigure_during_lookup(self):
+        # Changing the concurrency while a lookup is in flight doesn't fail the lookup
+        class Backend(QueryBackend):
+            def __init__(self, uri, reconfigure=False):
+                self.uri = uri
+                self.reconfigure = reconfigure
+            def get_term_by_uri(self, ontology, uri):
+                return None
+            def get_uri_by_term(self, ontology, term):
+                if self.reconfigure:
+                    configure_concurrency(2)
+                return self.uri
+        try:
+            configure_concurrency(4)
+            ontology = Ontology(endpoints=[Backend(None, reconfigure=True), Backend(None), Backend('http://example.org/c')])
+            self.assertEqual(ontology.get_uri_by_term('c'), 'http://example.org/c')
+            # Later lookups use the new thread pool
+            self.assertEqual(ontology.get_uri_by_term('d'), 'http://example.org/c')
+        finally:
+            configure_concurrency()
+
+    def test_reconfigure_connection_pools(self):
+        # Resizing the connection pools replaces the shared session, leaving the previous
+        # one, and the requests sent on it, untouched
+        previous = SPARQLEndpoint.session
+        try:
+            configure_concurrency(32)
+            session = SPARQLEndpoint.session
+            self.assertIsNot(session, previous)
+            self.assertEqual(session.get_adapter('https://').poolmanager.connection_pool_kw['maxsize'], 32)
+            self.assertEqual(session.headers['Accept'], 'application/sparql-results+json')
+            self.assertEqual(previous.get_adapter('https://').poolmanager.connection_pool_kw['maxsize'], 16)
+        finally:
+            configure_concurrency()
+
+    def test_unreachable_endpoint_skipped(self):
+        # An endpoint that can't be reached isn't tried again for a while
+        import tyto.tyto
+        class Backend(QueryBackend):
+            def get_term_by_uri(self, ontology, uri):
+                return None
+            def get_uri_by_term(self, ontology, term):
+                raise requests.ConnectionError('unreachable')
+        backend = Backend()
+        ontology = Ontology(endpoints=[backend])
+        with unittest.mock.patch.object(backend, 'get_uri_by_term', wraps=backend.get_uri_by_term) as lookup:
+            self.assertRaises(LookupError, ontology.get_uri_by_term, 'a')
+            self.assertRaises(LookupError, ontology.get_uri_by_term, 'b')
+            self.assertEqual(lookup.call_count, 1)
+            with unittest.mock.patch.object(tyto.tyto, 'UNREACHABLE_BACKOFF', 0):
+                tyto.tyto._UNREACHABLE_ENDPOINTS.pop(backend)
+                self.assertRaises(LookupError, ontology.get_uri_by_term, 'c')
+                self.assertRaises(LookupError, ontology.get_uri_by_term, 'd')
+            self.assertEqual(lookup.call_count, 3)
+
+    def test_failed_lookup_not_cached(self):
+        # A term an endpoint failed to look up is asked for again once the endpoint recovers,
+        # rather than remembered as missing
+        import tyto.tyto
+        class Backend(QueryBackend):
+            available = False
+            def get_term_by_uri(self, ontology, uri):
+                return None
+            def get_uri_by_term(self, ontology, term):
+                if not self.available:
+                    raise requests.ConnectionError('unreachable')
+                return f'http://example.org/{term}'
+        backend = Backend()
+        ontology = Ontology(endpoints=[backend])
+        self.assertRaises(LookupError, ontology.get_uri_by_term, 'a')
+        backend.available = True
+        tyto.tyto._UNREACHABLE_ENDPOINTS.pop(backend)
+        self.assertEqual(ontology.get_uri_by_term('a'), 'http://example.org/a')
+
+    def test_endpoint_bug_raised(self):
+        # Only errors of an endpoint failing to answer are passed over, not bugs
+        class Backend(QueryBackend):
+            def get_term_by_uri(self, ontology, uri):
+                return None
+            def get_uri_by_term(self, ontology, term):
+                raise self.error
+        backend = Backend()
+        ontology = Ontology(endpoints=[backend])
+        for term, error in (('a', TypeError('bug')), ('b', KeyError('results')), ('c', ValueError('bug'))):
+            backend.error = error
+            self.assertRaises(type(error), ontology.get_uri_by_term, term)
+        # A response that can't be decoded is passed over, and the lookup asked again
+        backend.error = json.JSONDecodeError('Expecting value', '', 0)
+        self.assertRaisesRegex(LookupError, 'asked again', ontology.get_uri_by_term, 'd')
+
+    def test_ontology_not_at_ols(self):
+        # OLS has no answer for an ontology it doesn't have, so the local file answers
+        ols = type(EBIOntologyLookupService)()
+        ols.ontology_short_ids = {'http://purl.obolibrary.org/obo/ncbitaxon.owl': 'ncbitaxon'}
+        with tempfile.TemporaryDirectory() as cache_dir:
+            # A copy of the ontology, so that no other test has loaded its graph
+            test_ontology = os.path.join(cache_dir, 'container-ontology.ttl')
+            shutil.copy(os.path.join(os.path.dirname(os.path.realpath(__file__)), 'container-ontology.ttl'),
+                        test_ontology)
+            ContO = Ontology(path=test_ontology, endpoints=[ols],
+                             uri='https://sift.net/container-ontology/container-ontology')
+            with unittest.mock.patch.object(ols.session, 'get') as get:
+                self.assertEqual(ContO.coating, 'https://sift.net/container-ontology/container-ontology#coating')
+                get.assert_not_called()
+            self.assertIsNone(ols.is_child_of(ContO, 'http://a', 'http://b'))
+
+    def test_rejected_request_raised(self):
+        # A server error is passed over and asked again, but a rejected request reaches the caller
+        def respond(status_code):
+            response = requests.Response()
+            response.status_code = status_code
+            return response
+        endpoint = SPARQLEndpoint('http://example.org/sparql')
+        ontology = Ontology(endpoints=[endpoint])
+        with unittest.mock.patch.object(endpoint.session, 'get', return_value=respond(503)) as get:
+            self.assertRaises(LookupError, ontology.get_uri_by_term, 'a')
+            self.assertRaises(LookupError, ontology.get_uri_by_term, 'a')
+            self.assertEqual(get.call_count, 2)
+        for status_code in (400, 401, 403):
+            with unittest.mock.patch.object(endpoint.session, 'get', return_value=respond(status_code)):
+                self.assertRaises(EndpointRequestError, ontology.get_uri_by_term, f'b{status_code}')
+
+    def test_failed_batch_not_cached(self):
+        # A batch an endpoint failed to answer leaves its terms uncached, without asking
+        # for each of them in turn, and the terms it did find are saved to disk
+        import tyto.tyto
+        class Backend(QueryBackend):
+            available = False
+            def get_term_by_uri(self, ontology, uri):
+                return None
+            def get_uri_by_term(self, ontology, term):
+                return f'http://example.org/{term}'
+            def get_uris_by_terms(self, ontology, terms):
+                if not self.available:
+                    raise requests.ConnectionError('unreachable')
+                return {term: f'http://example.org/{term}' for term in terms}
+        backend = Backend()
+        ontology = Ontology(endpoints=[backend], uri='http://example.org/batch')
+        with unittest.mock.patch.object(backend, 'get_uri_by_term') as get_uri_by_term:
+            self.assertEqual(ontology.get_uris_by_terms(['a']), {})
+            get_uri_by_term.assert_not_called()
+        backend.available = True
+        tyto.tyto._UNREACHABLE_ENDPOINTS.pop(backend)
+        self.assertEqual(ontology.get_uris_by_terms(['a']), {'a': 'http://example.org/a'})
+        self.assertEqual(LOOKUP_CACHE.get('get_uri_by_term http://example.org/batch a'), 'http://example.org/a')
+
+    def test_ambiguous_term_reported(self):
+        # An endpoint's report that a term is ambiguous reaches the caller
+        class Backend(QueryBackend):
+            def get_term_by_uri(self, ontology, uri):
+                return None
+            def get_uri_by_term(self, ontology, term):
+                raise AmbiguousTermError(f'Ambiguous term {term}--found multiple URIs')
+        ontology = Ontology(endpoints=[Backend()])
+        with self.assertRaisesRegex(LookupError, 'Ambiguous term a'):
+            ontology.get_uri_by_term('a')
+        # A batch leaves out the ambiguous term, rather than failing
+        self.assertEqual(ontology.get_uris_by_terms(['b']), {})
+
+    def test_concurrent_misses_coalesced(self):
+        # Threads that look up the same uncached term at once share one query. The query
+        # is held until every thread has missed the cache, after which they wait for it
+        misses = Ontology.get_uri_by_term.cache_info().misses
+        class Backend(QueryBackend):
+            def get_term_by_uri(self, ontology, uri):
+                return None
+            def get_uri_by_term(self, ontology, term):
+                deadline = time.monotonic() + 5
+                while Ontology.get_uri_by_term.cache_info().misses < misses + 4 and time.monotonic() < deadline:
+                    time.sleep(0.001)
+                return f'http://example.org/{term}'
+        backend = Backend()
+        ontology = Ontology(endpoints=[backend])
+        with unittest.mock.patch.object(backend, 'get_uri_by_term', wraps=backend.get_uri_by_term) as lookup:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+                uris = list(executor.map(lambda _: ontology.get_uri_by_term('a'), range(4)))
+            self.assertEqual(Ontology.get_uri_by_term.cache_info().misses, misses + 4)
+            self.assertEqual(lookup.call_count, 1)
+        self.assertEqual(uris, ['http://example.org/a'] * 4)
+
+    def test_ontology_ids_loaded_once(self):
+        # Threads that use OLS at the same time share one load of its ontology index. The
+        # load is held until every thread has asked for the index
+        ols = type(EBIOntologyLookupService)()
+        started = threading.Semaphore(0)
+        def get_ontology_ids(_):
+            started.release()
+            return ols._get_ontology_ids()
+        def load():
+            for _ in range(4):
+                self.assertTrue(started.acquire(timeout=5))
+            ols.ontology_short_ids = {'http://purl.obolibrary.org/obo/ncbitaxon.owl': 'ncbitaxon'}
+        with unittest.mock.patch.object(ols, '_load_ontology_ids', side_effect=load) as load_ids:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+                indexes = list(executor.map(get_ontology_ids, range(4)))
+            self.assertEqual(load_ids.call_count, 1)
+        self.assertEqual([len(index) for index in indexes], [1, 1, 1, 1])
+
+    def test_lookup_cache(self):
+        # Terms found are saved on disk, and reused by later runs without querying
+        test_ontology = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'container-ontology.ttl')
+        with tempfile.TemporaryDirectory() as cache_dir:
+            with unittest.mock.patch.dict(os.environ, {'TYTO_CACHE_DIR': cache_dir}):
+                ContO = Ontology(path=test_ontology, uri='https://sift.net/container-ontology/container-ontology')
+                uri = ContO.get_uri_by_term('coating')
+                Ontology.get_uri_by_term.cache_clear()
+                with unittest.mock.patch.object(Ontology, '_handler') as handler:
+                    self.assertEqual(ContO.get_uri_by_term('coating'), uri)
+                    handler.assert_not_called()
+
+    def test_lookup_cache_file_version(self):
+        # Answers saved from a local file aren't reused for another version of the file
+        test_ontology = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'container-ontology.ttl')
+        uri = 'https://sift.net/container-ontology/container-ontology'
+        with tempfile.TemporaryDirectory() as cache_dir:
+            with unittest.mock.patch.dict(os.environ, {'TYTO_CACHE_DIR': cache_dir}):
+                original = os.path.join(cache_dir, 'original.ttl')
+                edited = os.path.join(cache_dir, 'edited.ttl')
+                shutil.copy(test_ontology, original)
+                with open(test_ontology) as f, open(edited, 'w') as g:
+                    g.write(f.read().replace('rdfs:label "coating"', 'rdfs:label "film"'))
+                self.assertEqual(Ontology(path=original, uri=uri).coating, f'{uri}#coating')
+                with self.assertRaises(LookupError):
+                    Ontology(path=edited, uri=uri).coating
+                self.assertEqual(Ontology(path=edited, uri=uri).film, f'{uri}#coating')
+
+    def test_disk_cache_eviction(self):
+        # The least recently used entries are deleted beyond maxsize, and expired entries
+        # once the cache is opened again
+        with tempfile.TemporaryDirectory() as cache_dir:
+            with unittest.mock.patch.dict(os.environ, {'TYTO_CACHE_DIR': cache_dir}), \
+                    unittest.mock.patch('time.time', side_effect=itertools.count(1000).__next__):
+                cache = DiskCache('test.sqlite', maxsize=2, expire_after=100)
+                cache.evict_every = 1
+                cache.touch_after = 0
+                cache['a'] = 1
+                cache['b'] = 2
+                self.assertEqual(cache.get('a'), 1)
+                cache['c'] = 3
+                self.assertIsNone(cache.get('b'))
+                self.assertEqual((cache.get('a'), cache.get('c')), (1, 3))
+                cache = DiskCache('test.sqlite', expire_after=0)
+                self.assertEqual(cache._connect().execute('SELECT count(*) FROM entries').fetchone(), (0,))
+
+    def test_http_cache(self):
+        # Responses are reused until they expire, then revalidated with their ETag
+        def respond(status_code, content=b''):
+            response = requests.Response()
+            response.status_code = status_code
+            response.headers['ETag'] = '"v1"'
+            response._content = content
+            return response
+        with tempfile.TemporaryDirectory() as cache_dir:
+            with unittest.mock.patch.dict(os.environ, {'TYTO_CACHE_DIR': cache_dir}):
+                session = CachedSession()
+                with unittest.mock.patch.object(requests.Session, 'request',
+                                                return_value=respond(200, b'{"label": "promoter"}')) as request:
+                    self.assertEqual(session.get('http://example.org/terms').json(), {'label': 'promoter'})
+                    self.assertEqual(CachedSession().get('http://example.org/terms').json(), {'label': 'promoter'})
+                    self.assertEqual(request.call_count, 1)
+                session.expire_after = 0
+                with unittest.mock.patch.object(requests.Session, 'request',
+                                                return_value=respond(304)) as request:
+                    self.assertEqual(session.get('http://example.org/terms').json(), {'label': 'promoter'})
+                    self.assertEqual(request.call_args[1]['headers']['If-None-Match'], '"v1"')
+                # A term that isn't found may be added upstream, so the response isn't kept
+                with unittest.mock.patch.object(requests.Session, 'request', return_value=respond(404)) as request:
+                    session.get('http://example.org/missing')
+                    self.assertEqual(CachedSession().get('http://example.org/missing').status_code, 404)
+                    self.assertEqual(request.call_count, 2)
+
+    def test_sparql_csv(self):
+        # Single-variable queries are answered as CSV, others as JSON
+        response = requests.Response()
+        response.status_code = 200
+        response._content = b'label\r\npromoter\r\n'
+        endpoint = SPARQLEndpoint('http://example.org/sparql')
+        with unittest.mock.patch.object(endpoint.session, 'get', return_value=response) as get:
+            self.assertEqual(endpoint.get_term_by_uri(None, 'http://example.org/promoter'), 'promoter')
+            self.assertEqual(get.call_args[1]['headers'], {'Accept': 'text/csv'})
+        # Without a charset, the CSV is still read as UTF-8
+        response._content = 'label\r\nprote\u00edna\r\n'.encode('utf-8')
+        response.headers['Content-Type'] = 'text/csv'
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)  # As set by requests
+        with unittest.mock.patch.object(endpoint.session, 'get', return_value=response):
+            self.assertEqual(endpoint.get_term_by_uri(None, 'http://example.org/proteina'), 'prote\u00edna')
+
+    def test_label_variants(self):
+        # A term is first looked up by the exact spellings of its label, with any separators
+        response = requests.Response()
+        response.status_code = 200
+        response._content = b'uri\r\nhttp://example.org/non-coding_RNA\r\n'
+        endpoint = SPARQLEndpoint('http://example.org/sparql')
+        with unittest.mock.patch.object(endpoint.session, 'get', return_value=response) as get:
+            self.assertEqual(endpoint.get_uri_by_term(None, 'non_coding_RNA'), 'http://example.org/non-coding_RNA')
+            self.assertIn('"non-coding RNA"', get.call_args[1]['params']['query'])
+            self.assertEqual(get.call_count, 1)
+
+    def test_sparql_post(self):
+        # Queries too long for a URL are POSTed
+        response = requests.Response()
+        response.status_code = 200
+        response._content = b'{"head": {"vars": ["a", "b"]}, "results": {"bindings": []}}'
+        endpoint = SPARQLEndpoint('http://example.org/sparql')
+        with unittest.mock.patch.object(endpoint.session, 'post', return_value=response) as post:
+            values = ' '.join(f'<http://example.org/{i}>' for i in range(100))
+            self.assertEqual(endpoint.query_rows(None, f'SELECT ?a ?b {{ VALUES ?a {{ {values} }} }}', ''), [])
+            self.assertIn('VALUES', post.call_args[1]['data']['query'])
+
+    def test_sparql_rows(self):
+        # Results are paired by row, so an unbound value doesn't shift the pairs after it
+        response = {'head': {'vars': ['uri', 'label']},
+                    'results': {'bindings': [{'uri': {'value': 'http://a'}},
+                                             {'uri': {'value': 'http://b'}, 'label': {'value': 'b'}}]}}
+        endpoint = SPARQLEndpoint('http://example.org/sparql')
+        self.assertEqual(endpoint.convert_rows(response), [('http://b', 'b')])
+
+    def test_batch_query_order(self):
+        # The same batch of terms makes the same query whatever their order, so its
+        # cached response is reused
+        endpoint = SPARQLEndpoint('http://example.org/sparql')
+        ontology = Ontology(endpoints=[endpoint], uri='http://example.org/ontology')
+        with unittest.mock.patch.object(endpoint, 'query_rows', return_value=[]) as query_rows:
+            endpoint.get_uris_by_terms(ontology, ['promoter', 'CDS', 'terminator'])
+            endpoint.get_uris_by_terms(ontology, ['terminator', 'promoter', 'CDS'])
+            endpoint.get_children_batch(ontology, ['http://b', 'http://a'])
+        queries = [call[0][1] for call in query_rows.call_args_list]
+        self.assertEqual(queries[0], queries[1])
+        self.assertLess(queries[2].index('<http://a>'), queries[2].index('<http://b>'))
+
+    def test_batch_label_values(self):
+        # A batch binds the spellings of each term's label, rather than filtering every
+        # label, and each URI found is mapped back to its term
+        endpoint = SPARQLEndpoint('http://example.org/sparql')
+        rows = [('http://example.org/non-coding_RNA', 'non-coding RNA')]
+        with unittest.mock.patch.object(endpoint, 'query_rows', return_value=rows) as query_rows:
+            self.assertEqual(endpoint.get_uris_by_terms(None, ['non_coding_RNA', 'promoter']),
+                             {'non_coding_RNA': 'http://example.org/non-coding_RNA'})
+        query = query_rows.call_args[0][1]
+        self.assertIn('VALUES ?label', query)
+        self.assertIn('"non-coding RNA"@en', query)
+        self.assertNotIn('FILTER', query)
+        # The same query, run on a local graph
+        test_ontology = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'container-ontology.ttl')
+        ContO = Ontology(path=test_ontology, uri='https://sift.net/container-ontology/container-ontology')
+        self.assertEqual(SPARQLEndpoint.get_uris_by_terms(ContO.graph, ContO, ['96_well_plate', 'coating']),
+                         {'96_well_plate': ContO['96 well plate'], 'coating': ContO.coating})
+
+    def test_ntriples(self):
+        # Local ontology files are parsed according to their file extension
+        test_ontology = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'container-ontology.ttl')
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            nt_path = os.path.join(tmp_dir, 'container-ontology.nt')
+            rdflib.Graph().parse(test_ontology, format='ttl').serialize(nt_path, format='nt', encoding='utf-8')
+            ContO = Ontology(path=nt_path, uri='https://sift.net/container-ontology/container-ontology')
+            self.assertEqual(ContO.coating, 'https://sift.net/container-ontology/container-ontology#coating')
+
+    def test_graph_cache(self):
+        # A parsed graph and its label index are pickled so the next load skips
+        # parsing the source file. Term lookups only need the label index. Oxigraph
+        # stores aren't pickled, so the test uses rdflib's in-memory store
+        test_ontology = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'container-ontology.ttl')
+        with tempfile.TemporaryDirectory() as cache_dir:
+            with unittest.mock.patch.dict(os.environ, {'TYTO_CACHE_DIR': cache_dir,
+                                                       'TYTO_USE_OXIGRAPH': '0'}):
+                graph = GraphEndpoint(test_ontology)
+                graph.load()
+                self.assertTrue(os.path.exists(graph._cache_path('graph')))
+                self.assertTrue(os.path.exists(graph._cache_path('labels')))
+                cached_graph = GraphEndpoint(test_ontology)
+                with unittest.mock.patch.object(rdflib.Graph, 'parse') as parse:
+                    cached_graph.load()
+                    self.assertTrue(cached_graph.is_loaded())
+                    self.assertEqual(cached_graph.get_uri_by_term(None, 'coating'),
+                                     graph.get_uri_by_term(None, 'coating'))
+                    self.assertEqual(len(cached_graph.graph), 0)
+                    self.assertEqual(sorted(cached_graph.query(None, 'SELECT ?s { ?s ?p ?o }', '')),
+                                     sorted(graph.query(None, 'SELECT ?s { ?s ?p ?o }', '')))
+                    parse.assert_not_called()
+
+    def test_cached_label_index_first(self):
+        # Once the label index of a local ontology is cached, terms are looked up in it
+        # rather than at the endpoints, without parsing the ontology
+        with tempfile.TemporaryDirectory() as cache_dir:
+            # A copy of the ontology, so that no other test has loaded its graph
+            test_ontology = os.path.join(cache_dir, 'container-ontology.ttl')
+            shutil.copy(os.path.join(os.path.dirname(os.path.realpath(__file__)), 'container-ontology.ttl'),
+                        test_ontology)
+            with unittest.mock.patch.dict(os.environ, {'TYTO_CACHE_DIR': cache_dir}):
+                GraphEndpoint(test_ontology).load()
+                endpoint = SPARQLEndpoint('http://example.org/sparql')
+                ContO = Ontology(path=test_ontology, endpoints=[endpoint])
+                with unittest.mock.patch.object(endpoint, 'get_uri_by_term') as get_uri_by_term:
+                    with unittest.mock.patch.object(rdflib.Graph, 'parse') as parse:
+                        self.assertEqual(ContO.coating, 'https://sift.net/container-ontology/container-ontology#coating')
+                        parse.assert_not_called()
+                    get_uri_by_term.assert_not_called()
+
+    def test_label_index_not_graph(self):
+        # A cached label index answers term lookups, but relation checks still go to the
+        # endpoints rather than parsing the ontology
+        with tempfile.TemporaryDirectory() as cache_dir:
+            test_ontology = os.path.join(cache_dir, 'container-ontology.ttl')
+            shutil.copy(os.path.join(os.path.dirname(os.path.realpath(__file__)), 'container-ontology.ttl'),
+                        test_ontology)
+            with unittest.mock.patch.dict(os.environ, {'TYTO_CACHE_DIR': cache_dir}):
+                GraphEndpoint(test_ontology).load()
+                endpoint = SPARQLEndpoint('http://example.org/sparql')
+                ContO = Ontology(path=test_ontology, endpoints=[endpoint])
+                with unittest.mock.patch.object(rdflib.Graph, 'parse') as parse, \
+                        unittest.mock.patch.object(endpoint, 'is_child_of', return_value=True) as is_child_of:
+                    self.assertTrue(ContO.coating.is_child_of(ContO.well))
+                    self.assertTrue(ContO.graph.is_loaded())
+                    self.assertFalse(ContO.graph.has_graph())
+                    is_child_of.assert_called_once()
+                    parse.assert_not_called()
+
+    def test_gzipped_ontology(self):
+        # Compressed ontologies are parsed in the format named by the rest of the extension
+        test_ontology = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'container-ontology.ttl')
+        with tempfile.TemporaryDirectory() as cache_dir:
+            compressed_ontology = os.path.join(cache_dir, 'container-ontology.ttl.gz')
+            with open(test_ontology, 'rb') as f, gzip.open(compressed_ontology, 'wb') as g:
+                shutil.copyfileobj(f, g)
+            with unittest.mock.patch.dict(os.environ, {'TYTO_CACHE_DIR': cache_dir}):
+                ContO = Ontology(path=compressed_ontology)
+                self.assertEqual(ContO.coating, 'https://sift.net/container-ontology/container-ontology#coating')
+                self.assertEqual(len(ContO.graph.graph), len(rdflib.Graph().parse(test_ontology)))
+
+    def test_shared_graph(self):
+        # Ontologies read from the same file share its graph, so it is parsed once
+        test_ontology = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'container-ontology.ttl')
+        self.assertIs(Ontology(path=test_ontology).graph, Ontology(path=test_ontology).graph)
+
 class TestOLS(unittest.TestCase):
 
     SO_endpoints = SO.endpoints
@@ -1,13 +1,72 @@
-from .tyto import Ontology, URI, Term, configure_cache_size
+import importlib
+import json
+import logging
+import os
+
+from .tyto import (Ontology, URI, Term, configure_cache_size, configure_concurrency, configure_disk_cache,
+                   cache_stats, warm_cache, _TRANSIENT)
 from .endpoint import Ontobee, EBIOntologyLookupService, PubChemAPI
-from .sbo import SBO
-from .so import SO
-from .ncit import NCIT
-from .om import OM
-from .ncbi_taxon import NCBITaxon
-from .sbol2 import SBOL2
-from .sbol3 import SBOL3
-from .edam import EDAM
-from .pubchem import PubChem
-from .paml import PAML
-from .uml import UML
+
+# Ontology instances are imported from their modules on first access, so that
+# users who only need one ontology don't pay to set up all of them
+_ONTOLOGY_MODULES = {
+    'SBO': 'sbo',
+    'SO': 'so',
+    'NCIT': 'ncit',
+    'OM': 'om',
+    'NCBITaxon': 'ncbi_taxon',
+    'SBOL2': 'sbol2',
+    'SBOL3': 'sbol3',
+    'EDAM': 'edam',
+    'PubChem': 'pubchem',
+    'PAML': 'paml',
+    'UML': 'uml',
+}
+
+__all__ = ['Ontology', 'URI', 'Term', 'configure_cache_size', 'configure_concurrency', 'configure_disk_cache',
+           'cache_stats', 'warm_cache',
+           'Ontobee', 'EBIOntologyLookupService', 'PubChemAPI',
+           'tyto', 'endpoint'] + list(_ONTOLOGY_MODULES)
+
+
+def __getattr__(name):
+    if name not in _ONTOLOGY_MODULES:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    module = importlib.import_module(f'.{_ONTOLOGY_MODULES[name]}', __name__)
+    ontology = getattr(module, name)
+    globals()[name] = ontology
+    return ontology
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_ONTOLOGY_MODULES))
+
+
+def _warm_cache_from_environment():
+    """Warms the cache with the terms listed in the JSON file named by TYTO_WARM, which
+    maps ontology names to lists of terms. See warm_cache. Since this runs at import,
+    a malformed file or an ontology that can't be set up is logged rather than raised
+    """
+    path = os.environ.get('TYTO_WARM')
+    if not path:
+        return
+    try:
+        with open(path) as f:
+            config = json.load(f)
+    except (OSError, ValueError) as x:
+        logging.getLogger(__name__).warning(f'Failed to read {path}: {x}')
+        return
+    if not isinstance(config, dict):
+        logging.getLogger(__name__).warning(f'Failed to read {path}: expected a JSON object of ontology names')
+        return
+    for name, terms in config.items():
+        if not isinstance(terms, list):
+            logging.getLogger(__name__).warning(f'Failed to warm the cache: expected a list of {name} terms')
+            continue
+        try:
+            warm_cache(__getattr__(name), terms)
+        except (AttributeError, LookupError) + _TRANSIENT as x:
+            logging.getLogger(__name__).warning(f'Failed to warm the cache: {x}')
+
+
+_warm_cache_from_environment()
@@ -0,0 +1,26 @@
+"""Command line interface to tyto, e.g., python -m tyto build-cache SO NCIT
+"""
+import argparse
+
+import tyto
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m tyto')
+    commands = parser.add_subparsers(dest='command', required=True)
+    build_cache = commands.add_parser('build-cache',
+                                      help='save a snapshot of the terms in ontologies, so that '
+                                           'later lookups of these terms needn\'t query an endpoint')
+    build_cache.add_argument('ontologies', nargs='+', metavar='ONTOLOGY',
+                             help='the name of an ontology, e.g., SO or NCIT')
+    args = parser.parse_args(argv)
+
+    for name in args.ontologies:
+        if name not in tyto._ONTOLOGY_MODULES:
+            parser.error(f'unknown ontology {name}')
+        ontology = getattr(tyto, name)
+        print(f'Saved {ontology.build_cache()} {name} terms')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,8 @@
-from .tyto import Ontology, Ontobee, installation_path, multi_replace
+from .tyto import Ontology, Ontobee, installation_path
 
 
 EDAM = Ontology(endpoints=[Ontobee],
-                uri='http://edamontology.org/EDAM.owl')
+                uri='http://edamontology.org/EDAM.owl',
+                uri_prefixes=['http://edamontology.org/'])
 """EDAM (EMBRACE Data and Methods) is an ontology of common bioinformatics operations, topics, types of data including identifiers, and formats. EDAM comprises common concepts (shared within the bioinformatics community) that apply to semantic annotation of resources."""
 
@@ -1,11 +1,562 @@
 import abc
+import csv
+import gzip
+import hashlib
+import itertools
+import logging
+import os
+import pathlib
+import pickle
+import re
+import string
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, wraps
 import requests
+import requests.adapters
+import urllib3.util.retry
+import urllib.error
 import urllib.parse
 import json
 from io import StringIO
 
 import rdflib
-from SPARQLWrapper import SPARQLWrapper, JSON
+
+try:
+    # Registers the Rust-backed Oxigraph store and its parsers with rdflib
+    from oxrdflib.store import OxigraphStore
+    OXIGRAPH_AVAILABLE = True
+except ImportError:
+    OxigraphStore = type(None)
+    OXIGRAPH_AVAILABLE = False
+
+OXIGRAPH_FORMATS = ('xml', 'turtle', 'nt', 'n3', 'trig', 'nquads')
+"""The rdflib formats that Oxigraph parses natively, as the ox- prefixed parsers"""
+
+try:
+    # A faster JSON parser, for large query results
+    from orjson import loads as _json_loads
+except ImportError:
+    _json_loads = json.loads
+
+
+LOGGER = logging.getLogger(__name__)
+
+TIMEOUT = (3.05, 30)
+"""Connect and read timeouts, in seconds, for HTTP requests to endpoints"""
+
+
+class DiskCache():
+    """A persistent mapping from strings to picklable values, kept in a SQLite database
+    in the user's cache directory so that it is shared from one run to the next. When
+    it holds more than maxsize entries, the least recently used ones are deleted, and
+    expired entries are deleted whenever the database is opened
+
+    :param filename: The name of the database file
+    :type filename: str
+    :param table: The name of the table holding the entries
+    :type table: str
+    :param expire_after: The number of seconds after which an entry is ignored, defaults to None, for never
+    :type expire_after: float, optional
+    :param maxsize: The maximum number of entries, defaults to 100000
+    :type maxsize: int, optional
+    """
+
+    evict_every = 100
+    """The number of writes between checks that the cache holds at most maxsize entries"""
+
+    touch_after = 60
+    """The number of seconds after which a read entry's access time is updated. Since
+    eviction needn't be exact, this saves a write on most reads"""
+
+    def __init__(self, filename, table='entries', expire_after=None, maxsize=100000):
+        self.filename = filename
+        self.table = table
+        self.expire_after = expire_after
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._db = None
+        self._db_path = None
+        self._writes = 0
+
+    def _connect(self):
+        # Resolve the location on every call, in case the cache directory has changed
+        path = cache_path(self.filename)
+        if self._db_path != path:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Each write is a single statement, so it is committed as it runs. In WAL mode,
+            # readers in other processes aren't blocked by a write, and a commit needn't
+            # wait for the database file to be synced to disk
+            self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute('PRAGMA synchronous=NORMAL')
+            columns = [row[1] for row in self._db.execute(f'PRAGMA table_info({self.table})')]
+            if columns and 'accessed_at' not in columns:
+                # Written by an earlier version of tyto, without access times
+                self._db.execute(f'DROP TABLE {self.table}')
+            self._db.execute(f'CREATE TABLE IF NOT EXISTS {self.table} '
+                             '(key TEXT PRIMARY KEY, value BLOB, stored_at REAL, accessed_at REAL)')
+            self._db.execute(f'CREATE INDEX IF NOT EXISTS {self.table}_accessed_at ON {self.table} (accessed_at)')
+            self._db_path = path
+            if self.expire_after is not None:
+                self._db.execute(f'DELETE FROM {self.table} WHERE stored_at < ?',
+                                 (time.time() - self.expire_after,))
+            self._evict()
+        return self._db
+
+    def _evict(self):
+        """Deletes the least recently used entries in excess of maxsize
+        """
+        self._db.execute(f'DELETE FROM {self.table} WHERE key IN (SELECT key FROM {self.table} '
+                         f'ORDER BY accessed_at LIMIT max(0, (SELECT count(*) FROM {self.table}) - ?))',
+                         (self.maxsize,))
+
+    def _key(self, key):
+        return hashlib.sha1(key.encode()).hexdigest()
+
+    def get(self, key, default=None):
+        try:
+            now = time.time()
+            with self._lock:
+                db = self._connect()
+                row = db.execute(f'SELECT value, stored_at, accessed_at FROM {self.table} WHERE key = ?',
+                                 (self._key(key),)).fetchone()
+                if not row or (self.expire_after is not None and now - row[1] >= self.expire_after):
+                    return default
+                if now - row[2] >= self.touch_after:
+                    db.execute(f'UPDATE {self.table} SET accessed_at = ? WHERE key = ?', (now, self._key(key)))
+            return pickle.loads(row[0])
+        except Exception as x:
+            LOGGER.warning(f'Failed to read cache {self._db_path}: {x}')
+        return default
+
+    def __setitem__(self, key, value):
+        try:
+            now = time.time()
+            with self._lock:
+                db = self._connect()
+                db.execute(f'INSERT OR REPLACE INTO {self.table} VALUES (?, ?, ?, ?)',
+                           (self._key(key), pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), now, now))
+                self._writes += 1
+                if self._writes % self.evict_every == 0:
+                    self._evict()
+        except Exception as x:
+            LOGGER.warning(f'Failed to write cache {self._db_path}: {x}')
+
+
+LOOKUP_CACHE = DiskCache('lookups.sqlite', 'lookups', expire_after=7 * 24 * 60 * 60)
+"""The terms and URIs found by Ontology lookups, which are reused for a week. Set
+TYTO_LOOKUP_CACHE=0 to disable the cache"""
+
+
+class CachedSession(requests.Session):
+    """An HTTP session that keeps responses to GET requests in a SQLite database in
+    the user's cache directory, so that they are reused from one run to the next.
+    A cached response is reused as is until it expires. After that it is revalidated
+    with a conditional request using its ETag or Last-Modified date, so an unchanged
+    response isn't downloaded again. Set TYTO_HTTP_CACHE=0 to disable the cache
+
+    :param expire_after: The number of seconds a cached response is reused without revalidating it
+    :type expire_after: float
+    """
+
+    cacheable_status_codes = (200,)
+    """Responses with other statuses aren't cached. A 404 for a term missing upstream,
+    for instance, would otherwise hide the term from every process until the response
+    expired, should it be added. Such misses are cached in memory by tyto.Ontology instead"""
+
+    def __init__(self, expire_after=7 * 24 * 60 * 60):
+        super().__init__()
+        self.expire_after = expire_after
+        # Expiry is handled here rather than by the DiskCache, since an expired response
+        # is still needed to revalidate it. Responses are larger than lookups, so fewer are kept
+        self._cache = DiskCache('http.sqlite', 'responses', maxsize=10000)
+
+    def request(self, method, url, params=None, headers=None, **kwargs):
+        if method.upper() != 'GET' or os.environ.get('TYTO_HTTP_CACHE', '1') == '0':
+            return super().request(method, url, params=params, headers=headers, **kwargs)
+
+        full_url = requests.Request('GET', url, params=params).prepare().url
+        accept = (headers or {}).get('Accept', self.headers.get('Accept', ''))
+        key = f'{accept} {full_url}'
+        cached = self._cache.get(key)
+        if cached and time.time() - cached['stored_at'] < self.expire_after:
+            return self._to_response(cached, full_url)
+
+        headers = dict(headers or {})
+        if cached and 'ETag' in cached['headers']:
+            headers['If-None-Match'] = cached['headers']['ETag']
+        if cached and 'Last-Modified' in cached['headers']:
+            headers['If-Modified-Since'] = cached['headers']['Last-Modified']
+        response = super().request(method, url, params=params, headers=headers, **kwargs)
+        if cached and response.status_code == 304:
+            cached['stored_at'] = time.time()
+            self._cache[key] = cached
+            return self._to_response(cached, full_url)
+        if (response.status_code in self.cacheable_status_codes
+                and 'no-store' not in response.headers.get('Cache-Control', '')):
+            self._cache[key] = {'status_code': response.status_code,
+                                'reason': response.reason,
+                                'headers': {k: response.headers[k] for k in ('Content-Type', 'ETag', 'Last-Modified')
+                                            if k in response.headers},
+                                'content': response.content,
+                                'stored_at': time.time()}
+        return response
+
+    def _to_response(self, cached, url):
+        response = requests.Response()
+        response.status_code = cached['status_code']
+        response.reason = cached['reason']
+        response.headers = requests.structures.CaseInsensitiveDict(cached['headers'])
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        response.url = url
+        response._content = cached['content']
+        return response
+
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+"""Statistics of a cache, with the same fields as those reported by functools.lru_cache"""
+
+
+class LRUCache():
+    """A thread-safe mapping that holds at most maxsize entries, discarding the least
+    recently used entry when full. With a maxsize of None, the cache is unbounded and
+    recency isn't tracked
+
+    :param maxsize: The maximum number of entries
+    :type maxsize: int
+    """
+
+    def __init__(self, maxsize=1000):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self._misses += 1
+                return default
+            self._hits += 1
+            if self.maxsize is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            self._evict()
+
+    def resize(self, maxsize):
+        """Changes the maximum number of entries. Entries are kept, except for the least
+        recently used ones that no longer fit
+        """
+        with self._lock:
+            self.maxsize = maxsize
+            self._evict()
+
+    def _evict(self):
+        if self.maxsize is None:
+            return
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def __len__(self):
+        return len(self._data)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._hits = 0
+            self._misses = 0
+
+    def cache_info(self):
+        with self._lock:
+            return CacheInfo(self._hits, self._misses, self.maxsize, len(self._data))
+
+
+_MISSING = object()
+
+
+def lru_cached(maxsize=1000):
+    """Decorates a function with an LRUCache of its results. Like functools.lru_cache,
+    the wrapper has cache_info and cache_clear methods, but its cache may also be
+    resized, keeping its entries, through the wrapper's cache attribute. Threads that
+    miss the cache with the same arguments at once share one call of the function,
+    rather than each sending the same query
+    """
+    def decorator(function):
+        cache = LRUCache(maxsize)
+        pending = {}  # The calls in progress, by key, with an Event set once each is cached
+        pending_lock = threading.Lock()
+
+        def call(key, args, kwargs):
+            result = function(*args, **kwargs)
+            cache[key] = result
+            return result
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            key = args + tuple(sorted(kwargs.items())) if kwargs else args
+            result = cache.get(key, _MISSING)
+            if result is not _MISSING:
+                return result
+            with pending_lock:
+                done = pending.get(key)
+                if done is None:
+                    done = pending[key] = threading.Event()
+                    waiting = False
+                else:
+                    waiting = True
+            if waiting:
+                done.wait()
+                result = cache.get(key, _MISSING)
+                # If the other call failed, or its result was already evicted, call again
+                return call(key, args, kwargs) if result is _MISSING else result
+            try:
+                return call(key, args, kwargs)
+            finally:
+                with pending_lock:
+                    del pending[key]
+                done.set()
+
+        wrapper.cache = cache
+        wrapper.cache_info = cache.cache_info
+        wrapper.cache_clear = cache.clear
+        return wrapper
+    return decorator
+
+
+def _create_session(headers=None, expire_after=None):
+    """Creates an HTTP session whose connections are kept alive and reused from one
+    request to the next, rather than opened anew for every request, and whose
+    responses are cached on disk (see CachedSession). Requests that
+    fail with a transient server error are retried. Connection failures are not,
+    since queries fall back to other endpoints or the local graph anyway
+    """
+    session = CachedSession() if expire_after is None else CachedSession(expire_after)
+    retry = urllib3.util.retry.Retry(total=3, connect=0, backoff_factor=0.2,
+                                     status_forcelist=(502, 503, 504), raise_on_status=False)
+    for scheme in ('http://', 'https://'):
+        session.mount(scheme, requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=_POOL_MAXSIZE,
+                                                            max_retries=retry))
+    if headers:
+        session.headers.update(headers)
+    return session
+
+
+_POOL_MAXSIZE = 16
+"""The number of connections kept alive per host by each session"""
+
+_SESSIONS_LOCK = threading.Lock()
+
+
+def configure_connection_pools(pool_maxsize):
+    """Sets how many connections to a host each HTTP session keeps alive. With fewer
+    connections than concurrent requests, the surplus connections are closed after each
+    request and opened afresh, with a new TLS handshake, for the next one.
+    Each shared session is replaced by a new one, rather than changed in place, so
+    requests already sent on the previous session finish undisturbed
+    """
+    global _POOL_MAXSIZE
+    with _SESSIONS_LOCK:
+        _POOL_MAXSIZE = pool_maxsize
+        for owner in _SESSION_OWNERS:
+            previous = owner.session
+            owner.session = _create_session(previous.headers, previous.expire_after)
+
+
+def configure_disk_caches(cache_dir, expire_after):
+    """Sets the directory of the caches kept from one run to the next, overriding
+    TYTO_CACHE_DIR unless cache_dir is None, and how long cached lookups and HTTP
+    responses are reused
+    """
+    global _CACHE_DIR
+    _CACHE_DIR = cache_dir
+    LOOKUP_CACHE.expire_after = expire_after
+    with _SESSIONS_LOCK:
+        for owner in _SESSION_OWNERS:
+            owner.session.expire_after = expire_after
+
+
+class EndpointRequestError(Exception):
+    """Raised when an endpoint rejects a request, e.g., a malformed query or one that
+    isn't authorized. Unlike a server error, the request fails the same way if repeated
+    """
+
+
+def _request_error(url, response):
+    """Returns the error to raise for a response that failed. Server errors and rate
+    limiting may pass, so they are reported as an urllib.error.HTTPError, after which
+    the next back-end is asked and the lookup is tried again later. Other client errors
+    are reported as an EndpointRequestError, which reaches the caller
+    """
+    if response.status_code >= 500 or response.status_code == 429:
+        return urllib.error.HTTPError(url, response.status_code, response.reason, response.headers, None)
+    return EndpointRequestError(f'{url} rejected the request: {response.status_code} {response.reason}')
+
+
+def _parse_json(response):
+    """Decodes a JSON response body, with orjson if it is installed. The services tyto
+    queries encode JSON as UTF-8, which both parsers read directly from the raw bytes
+    """
+    return _json_loads(response.content)
+
+
+_CACHE_DIR = None
+"""The cache directory set by configure_disk_caches, if any"""
+
+
+def cache_path(*relative_path):
+    """Returns a path inside the user's tyto cache directory. The location defaults to
+    ~/.cache/tyto and may be overridden with the TYTO_CACHE_DIR environment variable,
+    or with tyto.configure_disk_cache
+    """
+    cache_dir = _CACHE_DIR or os.environ.get('TYTO_CACHE_DIR',
+                                             os.path.join(os.path.expanduser('~'), '.cache', 'tyto'))
+    return os.path.join(cache_dir, *relative_path)
+
+
+def _use_oxigraph():
+    """Local ontologies are parsed into an Oxigraph store when the optional oxrdflib
+    package is installed, unless disabled by setting TYTO_USE_OXIGRAPH=0
+    """
+    return OXIGRAPH_AVAILABLE and os.environ.get('TYTO_USE_OXIGRAPH', '1') != '0'
+
+
+# The only prefixes used by the query templates. Passing these to Graph.query saves
+# rdflib from collecting every namespace bound in the graph on each query
+_QUERY_NAMESPACES = {prefix: str(namespace) for prefix, namespace in
+                     [('rdf', rdflib.RDF), ('rdfs', rdflib.RDFS), ('owl', rdflib.OWL), ('xsd', rdflib.XSD)]}
+
+
+@lru_cache(maxsize=None)
+def _prepare_query(sparql):
+    """Parses and translates a SPARQL query once, so it can be evaluated repeatedly
+    """
+    # Imported here since loading rdflib's SPARQL grammar is slow
+    from rdflib.plugins.sparql import prepareQuery
+    return prepareQuery(sparql, initNs=_QUERY_NAMESPACES)
+
+
+def _normalize_label(label):
+    """Reduces a label to a case- and separator-insensitive key, so that all labels
+    which could match a term share the same key
+    """
+    return re.sub(r'[\-\_\s]', ' ', label).lower()
+
+
+def _label_pattern(term, flags=0):
+    """Compiles the pattern used to match a term against labels. Spaces in the term
+    match a space, hyphen, or underscore in the label
+    """
+    return re.compile(r'[\-\_\s]'.join(re.escape(t) for t in term.split(' ')), flags)
+
+
+_MAX_LABEL_SEPARATORS = 3
+"""Labels with more separators than this aren't expanded into every spelling by
+_label_variants, since the number of spellings grows threefold per separator"""
+
+
+def _label_variants(label):
+    """Spells a label with each combination of spaces, hyphens and underscores between
+    its words. A label with many words is only spelled with all spaces or all
+    underscores
+    """
+    words = re.split(r'[\-\_\s]', label)
+    if len(words) - 1 > _MAX_LABEL_SEPARATORS:
+        return list(dict.fromkeys((label, label.replace('_', ' '), label.replace(' ', '_'))))
+    variants = [label]
+    for separators in itertools.product(' _-', repeat=len(words) - 1):
+        variants.append(''.join(itertools.chain.from_iterable(zip(words, separators))) + words[-1])
+    return list(dict.fromkeys(variants))
+
+
+class AmbiguousTermError(LookupError):
+    """Raised when a term matches the labels of more than one URI
+    """
+
+
+def _resolve_label_matches(term, candidates):
+    """Selects the URI that matches the term from a list of (label, URI) pairs,
+    following the same rules as SPARQLBuilder.get_uri_by_term
+    """
+    pattern = _label_pattern(term, re.IGNORECASE)
+    matches = {uri for label, uri in candidates if pattern.fullmatch(label)}
+    if len(matches) > 1:
+        # If response was ambiguous, try again with a case-sensitive match instead:
+        pattern = _label_pattern(term)
+        matches = {uri for label, uri in candidates if pattern.fullmatch(label)}
+        if not matches:
+            # if it was ambiguous before, but got nothing now, then it's the wrong case
+            return None
+        if len(matches) > 1:
+            # if it's still ambiguous, then raise an exception
+            raise AmbiguousTermError(f'Ambiguous term {term}--found multiple URIs {sorted(matches)}')
+    if not matches:
+        return None
+    return matches.pop()
+
+
+def _quote_literal(value):
+    """Writes a string as a SPARQL string literal
+    """
+    return '"{}"'.format(value.replace('\\', '\\\\').replace('"', '\\"'))
+
+
+def _read_pickle(path):
+    """Reads an object cached by _write_pickle, or returns None if there is none or it
+    can't be read
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+    except Exception as x:
+        LOGGER.warning(f'Failed to read cache {path}: {x}')
+    return None
+
+
+def _write_pickle(path, obj):
+    """Caches an object in a pickle file. Failures are logged rather than raised,
+    since the object can be computed again
+    """
+    tmp_path = None
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temporary file first so a concurrent reader never sees a partial pickle
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except Exception as x:
+        LOGGER.warning(f'Failed to write cache {path}: {x}')
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _index_labels(terms):
+    """Maps normalized labels to the (label, URI) pairs that share them, given
+    (URI, label) pairs
+    """
+    label_index = {}
+    for uri, label in terms:
+        # Labels and URIs repeat across the index, e.g., for terms with several
+        # labels, so intern them to share one copy. Pickle preserves the sharing
+        label = sys.intern(str(label))
+        label_index.setdefault(_normalize_label(label), []).append((label, sys.intern(str(uri))))
+    return label_index
 
 
 class QueryBackend(abc.ABC):
@@ -18,11 +569,274 @@ class QueryBackend(abc.ABC):
     def get_uri_by_term(self, ontology: "Ontology", term: str):
         return
 
+    max_workers = 1
+    """The number of lookups a batch query may have in flight at once. See tyto.configure_concurrency"""
+
+    concurrent_lookups = True
+    """Whether get_uris_by_terms looks up terms concurrently. Back-ends that answer
+    lookups in-process, rather than by querying a server, look terms up one at a time"""
+
+    def get_uris_by_terms(self, ontology: "Ontology", terms: list):
+        """Query for the URIs of several terms. By default each term is looked up
+        individually, with up to max_workers lookups in flight at once if concurrent_lookups
+        is set; backends that can resolve a batch of terms with a single request override
+        this method
+
+        :return: A dictionary mapping each term found to its URI, or None if no terms were found
+        :rtype: dict
+        """
+        def look_up(term):
+            return self._get_unambiguous_uri(ontology, term)
+        results = self._map(look_up, terms) if self.concurrent_lookups else [look_up(term) for term in terms]
+        uris = {term: uri for term, uri in zip(terms, results) if uri is not None}
+        return uris or None
+
+    def _get_unambiguous_uri(self, ontology: "Ontology", term: str):
+        """Looks up a term for a batch. An ambiguous term is left out of the batch rather
+        than failing it, and is reported when Ontology.get_uri_by_term looks it up alone
+        """
+        try:
+            return self.get_uri_by_term(ontology, term)
+        except AmbiguousTermError:
+            return None
+
+    def _map(self, function, items):
+        """Applies a function to each item, with up to max_workers calls in flight at once
+        """
+        if self.max_workers > 1 and len(items) > 1:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(items))) as executor:
+                return list(executor.map(function, items))
+        return [function(item) for item in items]
+
+    def prefetch(self, ontology: "Ontology", uris: list):
+        """Fetches data about several terms at once, in anticipation of later queries.
+        Back-ends that support this override this method and return True
+        """
+        return None
+
+    def get_terms(self, ontology: "Ontology"):
+        """Lists every term in the ontology, for saving in a TermIndex. Back-ends that
+        support this override this method
+
+        :return: (URI, label) pairs, or None if the back-end can't list terms
+        :rtype: list
+        """
+        return None
+
+
+class TermIndex(QueryBackend):
+    """A snapshot of an ontology's terms and their URIs, saved on disk by
+    Ontology.build_cache, e.g., via ``python -m tyto build-cache NCIT``. Lookups
+    of terms in the snapshot are answered without querying an endpoint
+    """
+
+    concurrent_lookups = False
+
+    def __init__(self, terms):
+        """
+        :param terms: (URI, label) pairs
+        :terms: iterable
+        """
+        self.label_index = _index_labels(terms)
+        self.labels = {}
+        for label, uri in (pair for pairs in self.label_index.values() for pair in pairs):
+            self.labels.setdefault(uri, label)
+
+    def __len__(self):
+        return len(self.labels)
+
+    @staticmethod
+    def path(ontology: "Ontology"):
+        digest = hashlib.sha1(ontology.uri.encode()).hexdigest()[:16]
+        return cache_path('terms', f'{digest}.pickle')
+
+    @classmethod
+    def load(cls, ontology: "Ontology"):
+        """Reads the ontology's snapshot, or returns None if none has been saved
+        """
+        return _read_pickle(cls.path(ontology))
+
+    def save(self, ontology: "Ontology"):
+        _write_pickle(self.path(ontology), self)
+
+    def get_term_by_uri(self, ontology: "Ontology", uri: str):
+        return self.labels.get(uri)
+
+    def get_uri_by_term(self, ontology: "Ontology", term: str):
+        candidates = self.label_index.get(_normalize_label(term))
+        if not candidates:
+            return None
+        return _resolve_label_matches(term, candidates)
+
+
+def _compact(sparql):
+    """Collapses the layout of a query template to single spaces, which shortens the
+    URL of each query sent to an endpoint and the keys under which queries and their
+    responses are cached. Templates must not contain comments or string literals with
+    consecutive spaces
+    """
+    return ' '.join(sparql.split())
+
+
+# Query templates are parsed once, at import. Placeholders such as $values are filled
+# in by SPARQLBuilder with string.Template, while the {from_clause} marker is left for
+# the endpoint to replace, so neither stage needs the braces of the query escaped.
+# Queries whose results are collected into a set or dictionary don't ask for DISTINCT
+# results, which would have the endpoint deduplicate the whole result first
+FROM_CLAUSE = '{from_clause}'
+
+# Matches queries whose results have a single column, e.g., SELECT distinct ?label WHERE
+_SINGLE_VARIABLE_SELECT = re.compile(r'\s*SELECT\s+(?:DISTINCT\s+)?\?\w+(?=\s*(?:FROM|WHERE|\{))',
+                                     re.IGNORECASE)
+
+_Q_TERM_BY_URI = _compact('''
+    SELECT ?label
+    WHERE
+    {
+        ?uri rdfs:label ?label
+    }
+    ORDER BY DESC(langMatches(lang(?label), "en"))
+    LIMIT 1
+    ''')
+
+_Q_URIS_BY_LABEL = string.Template(_compact('''
+    SELECT distinct ?uri
+    {from_clause}
+    WHERE
+    {
+        VALUES ?label { $labels }
+        ?uri rdfs:label ?label
+    }
+    LIMIT 2
+    '''))
+
+_Q_LABEL_CANDIDATES = string.Template(_compact('''
+    SELECT distinct ?uri ?term
+    {from_clause}
+    WHERE
+    {
+        {
+            ?uri rdfs:label ?term
+        }
+        FILTER(REGEX(?term, '$term', "i"))
+    }
+    '''))
+
+_Q_URIS_BY_TERMS = string.Template(_compact('''
+    SELECT ?uri ?label
+    {from_clause}
+    WHERE
+    {
+        VALUES ?label { $labels }
+        ?uri rdfs:label ?label
+    }
+    '''))
+
+_Q_TERMS = string.Template(_compact('''
+    SELECT ?uri ?label
+    {from_clause}
+    WHERE
+    {
+        ?uri rdfs:label ?label .
+        FILTER(isIRI(?uri))
+    }
+    ORDER BY ?uri
+    LIMIT $limit
+    OFFSET $offset
+    '''))
+
+_Q_CHILDREN_BATCH = string.Template(_compact('''
+    SELECT ?parent ?child
+    {from_clause}
+    WHERE
+    {
+        VALUES ?parent { $values }
+        ?child rdf:type owl:Class .
+        ?child rdfs:subClassOf ?parent
+    }
+    '''))
+
+_Q_PARENTS_BATCH = string.Template(_compact('''
+    SELECT ?child ?parent
+    {from_clause}
+    WHERE
+    {
+        VALUES ?child { $values }
+        ?child rdf:type owl:Class .
+        ?child rdfs:subClassOf ?parent
+    }
+    '''))
+
+_Q_ANCESTORS = _compact('''
+    SELECT ?superclass
+    {from_clause}
+    WHERE
+    {
+        ?descendant_uri rdfs:subClassOf* ?superclass .
+        ?superclass rdf:type owl:Class .
+    }
+    ''')
+
+_Q_IS_DESCENDANT = _compact('''
+    ASK
+    {from_clause}
+    WHERE
+    {
+        ?descendant_uri rdf:type owl:Class .
+        ?descendant_uri rdfs:subClassOf* ?ancestor_uri
+    }
+    ''')
+
+_Q_ONTOLOGIES = _compact('''
+    SELECT ?ontology_uri ?title
+    {from_clause}
+    WHERE
+      {
+        ?ontology_uri a owl:Ontology .
+        ?ontology_uri <http://purl.org/dc/elements/1.1/title> ?title
+      }
+    ''')
+
+_Q_IS_INSTANCE = _compact('''
+    ASK
+    {from_clause}
+    WHERE
+      {
+        ?uri a owl:NamedIndividual .
+      }
+    ''')
+
+_Q_INSTANCES = _compact('''
+    SELECT distinct ?instance
+    {from_clause}
+    WHERE
+      {
+        ?instance a owl:NamedIndividual .
+        ?instance a ?cls .
+      }
+    ''')
+
 
 class SPARQLBuilder():
     """Mixin class that provides SPARQL queries to SPARQLEndpoint and GraphEndpoint classes
     """
 
+    cached_queries = ('_get_uris_by_label', '_get_label_candidates', '_get_ancestor_uris', '_is_descendant_of')
+    """Methods whose results are kept in an LRUCache, sized by tyto.configure_cache_size"""
+
+    relation_cache = LRUCache()
+    """The children and parents of terms, keyed on the endpoint, ontology, relation and
+    URI. Filled by get_children_batch and get_parents_batch"""
+
+    def _bound_query(self, ontology, query, error_msg, **bindings):
+        """Runs a query in which the named variables stand for the given URIs. By
+        default, the URIs are written into the query text
+        """
+        query = re.sub(r'\?(\w+)',
+                       lambda m: f'<{bindings[m.group(1)]}>' if m.group(1) in bindings else m.group(0),
+                       query)
+        return self.query(ontology, query, error_msg)
+
     def get_term_by_uri(self, ontology, uri):
         """Query for a term by its URI
 
@@ -31,23 +845,8 @@ class SPARQLBuilder():
         :param ontology: The Ontology to query
         :ontology: Ontology
         """
-        query = '''
-            SELECT distinct ?label
-            WHERE
-            {{{{
-                optional
-                {{{{
-                    <{uri}> rdfs:label ?label .
-                     filter langMatches(lang(?label), "en")
-                }}}}
-                optional
-                {{{{
-                    <{uri}> rdfs:label ?label .
-                }}}}
-            }}}}
-            '''.format(uri=uri)
         error_msg = '{} not found'.format(uri)
-        response = self.query(ontology, query, error_msg)
+        response = self._bound_query(ontology, _Q_TERM_BY_URI, error_msg, uri=uri)
         if not response:
             return None
         response = response[0]
@@ -61,156 +860,199 @@ class SPARQLBuilder():
         :ontology: Ontology
         """
 
-        # Queries to the sequence ontology require the xsd:string datatype
-        # whereas queries to the systems biology ontology do not, hence the
-        # UNION in the query. Additionally, terms in SBO have spaces rather
-        # than underscores. This creates a problem when looking up terms by
-        # an attribute, e.g., SBO.systems_biology_representation
-        query = '''
-            SELECT distinct ?uri
-            {{from_clause}}
-            WHERE
-            {{{{
-                {{{{
-                    ?uri rdfs:label ?term
-                }}}}
-                FILTER(REGEX(?term, '{term}', "i"))
-            }}}}
-            '''.format(term='^' + term.replace(' ', r'[\\-\\_\\s]') + '$')
-        error_msg = '{} not a valid ontology term'.format(term)
-        response = self.query(ontology, query, error_msg)
-        if not response:
+        # A label that matches the term exactly, up to its separators, is found
+        # with an index lookup, whereas matching labels regardless of case or separators
+        # scans them all. Terms in SBO have spaces rather than underscores, for instance,
+        # so SBO.systems_biology_representation is found by the former
+        uris = self._get_uris_by_label(ontology, term)
+        if len(uris) == 1:
+            return uris[0]
+        candidates = self._get_label_candidates(ontology, _normalize_label(term))
+        if not candidates:
             return None
-        if len(response) > 1:
-            # If response was ambiguous, try again with a case-sensitive query instead:
-            case_sensitive_query = '''
-                SELECT distinct ?uri
-                {{from_clause}}
-                WHERE
-                {{{{
-                    {{{{
-                        ?uri rdfs:label ?term
-                    }}}}
-                    FILTER(REGEX(?term, '{term}'))
-                }}}}
-                '''.format(term='^' + term.replace(' ', r'[\\-\\_\\s]') + '$')
-            response = self.query(ontology, case_sensitive_query, error_msg)
-            if not response:
-                # if it was ambiguous before, but got nothing now, then it's the wrong case
-                return None
-            if len(response) > 1:
-                # if it's still ambiguous, then raise an exception
-                raise Exception(f'Ambiguous term {term}--found multiple URIs {response}')
-        response = response[0]
-        return response
+        return _resolve_label_matches(term, candidates)
+
+    @lru_cached(maxsize=1000)
+    def _get_uris_by_label(self, ontology: "Ontology", label: str) -> tuple:
+        """Query for the URIs of terms with exactly the given label, or the label with
+        other separators between its words (see _label_variants). Since only a unique
+        match is used, at most two URIs are returned
+        """
+        labels = _label_variants(label)
+        # Labels in the sequence ontology have the xsd:string datatype, whereas those in
+        # the systems biology ontology do not, so both forms are looked up
+        literals = ' '.join(f'{literal} {literal}@en {literal}^^xsd:string'
+                            for literal in map(_quote_literal, labels))
+        query = _Q_URIS_BY_LABEL.substitute(labels=literals)
+        return tuple(self.query(ontology, query, ''))
+
+    @lru_cached(maxsize=1000)
+    def _get_label_candidates(self, ontology: "Ontology", normalized_term: str) -> tuple:
+        """Query for all (label, URI) pairs whose label matches a normalized term,
+        regardless of case or separators. The candidates are then narrowed down to the
+        term in-process, so case variants of a term, e.g., SBO.NON_CODING_RNA and
+        SBO.non_coding_rna, share one cached query and an ambiguous term doesn't need
+        a second, case-sensitive query
+        """
+        query = _Q_LABEL_CANDIDATES.substitute(
+            term='^' + normalized_term.replace(' ', r'[\\-\\_\\s]') + '$')
+        error_msg = '{} not a valid ontology term'.format(normalized_term)
+        rows = self.query_rows(ontology, query, error_msg)
+        return tuple((label, uri) for uri, label in rows)
+
+    def get_uris_by_terms(self, ontology: "Ontology", terms: list) -> dict:
+        """Query for the URIs of several ontology terms with a single query, rather than
+        one query per term
+
+        :param terms: The ontology terms
+        :terms: list
+        :param ontology: The ontology to query
+        :ontology: Ontology
+        """
+        # As in _get_uris_by_label, each term is looked up by the exact spellings of its
+        # label, so the endpoint finds them in its index of labels. The labels are sorted
+        # so that the same terms always make the same query, whose response may then be
+        # cached from one run to the next
+        labels = {}
+        for term in terms:
+            for label in _label_variants(term):
+                labels.setdefault(label, []).append(term)
+        literals = ' '.join(f'{literal} {literal}@en {literal}^^xsd:string'
+                            for literal in map(_quote_literal, sorted(labels)))
+        query = _Q_URIS_BY_TERMS.substitute(labels=literals)
+        error_msg = 'None of {} are valid ontology terms'.format(terms)
+        rows = self.query_rows(ontology, query, error_msg)
+        if not rows:
+            return None
+
+        # Like get_uri_by_term, only a term with a unique match is resolved here. Terms
+        # with no match or several are left to Ontology.get_uri_by_term, which also
+        # matches labels regardless of case and reports ambiguous terms
+        matches = {}
+        for uri, label in rows:
+            for term in labels.get(label, ()):
+                matches.setdefault(term, set()).add(uri)
+        uris = {term: found.pop() for term, found in matches.items() if len(found) == 1}
+        return uris or None
+
+    page_size = 10000
+    """The number of terms requested per query by get_terms. Public SPARQL endpoints
+    commonly cap the size of a result at 10000 rows"""
+
+    def get_terms(self, ontology: "Ontology") -> list:
+        """Lists the URI and label of every term in the ontology, a page at a time
+        """
+        terms = []
+        while True:
+            query = _Q_TERMS.substitute(limit=self.page_size, offset=len(terms))
+            rows = self.query_rows(ontology, query, '')
+            terms.extend(rows)
+            if len(rows) < self.page_size:
+                return terms
 
     def is_child_of(self, ontology: "Ontology", child_uri: str, parent_uri: str) -> bool:
-        query = f'''
-            SELECT distinct ?child 
-            {{from_clause}}
-            WHERE 
-            {{{{
-                ?child rdf:type owl:Class .
-                ?child rdfs:subClassOf <{parent_uri}>
-            }}}}
-            '''
-        error_msg = ''
-        child_terms = self.query(ontology, query, error_msg)
-        return child_uri in child_terms
+        return child_uri in self._get_child_uris(ontology, parent_uri)
 
     def is_parent_of(self, ontology: "Ontology", parent_uri: str, child_uri: str) -> bool:
-        query = f'''
-            SELECT distinct ?parent
-            {{from_clause}}
-            WHERE 
-            {{{{
-                <{child_uri}> rdf:type owl:Class .
-                <{child_uri}> rdfs:subClassOf ?parent
-            }}}}
-            '''
-        error_msg = ''
-        parent_terms = self.query(ontology, query, error_msg)
-        return parent_uri in parent_terms
+        return parent_uri in self._get_parent_uris(ontology, child_uri)
 
     def is_ancestor_of(self, ontology: "Ontology", ancestor_uri: str, descendant_uri: str) -> bool:
-        query = f'''
-            SELECT distinct ?superclass
-            {{from_clause}}
-            WHERE 
-            {{{{
-                <{descendant_uri}> rdfs:subClassOf* ?superclass .
-                ?superclass rdf:type owl:Class .
-            }}}}
-            '''
-        error_msg = ''
-        ancestors = self.query(ontology, query, error_msg)
-        return ancestor_uri in ancestors
+        return ancestor_uri in self._get_ancestor_uris(ontology, descendant_uri)
 
     def is_descendant_of(self, ontology: "Ontology", descendant_uri: str, ancestor_uri: str) -> bool:
-        query = f'''
-            SELECT distinct ?descendant
-            {{from_clause}}
-            WHERE 
-            {{{{
-                ?descendant rdf:type owl:Class .
-                ?descendant rdfs:subClassOf* <{ancestor_uri}>
-            }}}}
-            '''
+        return self._is_descendant_of(ontology, descendant_uri, ancestor_uri)
+
+    # Except for is_descendant_of, the relation checks above cache the full set of
+    # related terms rather than a yes or no answer, so checking other terms against
+    # the same URI is a set lookup. The descendants of a term near the root can number
+    # in the hundreds of thousands, so is_descendant_of asks the endpoint instead
+
+    def _get_child_uris(self, ontology: "Ontology", parent_uri: str) -> frozenset:
+        return self.get_children_batch(ontology, [parent_uri])[parent_uri]
+
+    def _get_parent_uris(self, ontology: "Ontology", child_uri: str) -> frozenset:
+        return self.get_parents_batch(ontology, [child_uri])[child_uri]
+
+    def get_children_batch(self, ontology: "Ontology", parent_uris: list) -> dict:
+        """Query for the children of several terms with a single query
+
+        :param parent_uris: The URIs of the parent terms
+        :parent_uris: list
+        :param ontology: The ontology to query
+        :ontology: Ontology
+        :return: A dictionary mapping each parent URI to the set of its children's URIs
+        :rtype: dict
+        """
+        return self._get_related_batch(ontology, 'children', parent_uris, _Q_CHILDREN_BATCH)
+
+    def get_parents_batch(self, ontology: "Ontology", child_uris: list) -> dict:
+        """Query for the parents of several terms with a single query
+
+        :param child_uris: The URIs of the child terms
+        :child_uris: list
+        :param ontology: The ontology to query
+        :ontology: Ontology
+        :return: A dictionary mapping each child URI to the set of its parents' URIs
+        :rtype: dict
+        """
+        return self._get_related_batch(ontology, 'parents', child_uris, _Q_PARENTS_BATCH)
+
+    def _get_related_batch(self, ontology, relation, uris, query):
+        """Runs a query that relates each URI in its VALUES clause to other URIs, for the
+        URIs whose related terms aren't cached yet, and caches the results
+        """
+        related = {}
+        for uri in uris:
+            cached = self.relation_cache.get((self, ontology, relation, uri))
+            if cached is not None:
+                related[uri] = cached
+        missing = [uri for uri in dict.fromkeys(uris) if uri not in related]
+        if missing:
+            # Sorted, like the terms of get_uris_by_terms, so the query doesn't depend on their order
+            values = ' '.join(f'<{uri}>' for uri in sorted(missing))
+            rows = self.query_rows(ontology, query.substitute(values=values), '')
+            found = {uri: set() for uri in missing}
+            for uri, related_uri in rows:
+                if uri in found:
+                    found[uri].add(related_uri)
+            for uri, related_uris in found.items():
+                related[uri] = frozenset(related_uris)
+                self.relation_cache[(self, ontology, relation, uri)] = related[uri]
+        return related
+
+    def prefetch(self, ontology: "Ontology", uris: list) -> bool:
+        """Fetches the children and parents of several terms with one query each, so that
+        subsequent relation checks on those terms needn't query the endpoint
+        """
+        self.get_children_batch(ontology, uris)
+        self.get_parents_batch(ontology, uris)
+        return True
+
+    @lru_cached(maxsize=1000)
+    def _get_ancestor_uris(self, ontology: "Ontology", descendant_uri: str) -> frozenset:
         error_msg = ''
-        descendants = self.query(ontology, query, error_msg)
-        return descendant_uri in descendants
+        return frozenset(self._bound_query(ontology, _Q_ANCESTORS, error_msg, descendant_uri=descendant_uri))
+
+    @lru_cached(maxsize=1000)
+    def _is_descendant_of(self, ontology: "Ontology", descendant_uri: str, ancestor_uri: str) -> bool:
+        error_msg = ''
+        return self._bound_query(ontology, _Q_IS_DESCENDANT, error_msg, descendant_uri=descendant_uri,
+                                 ancestor_uri=ancestor_uri)
 
     def get_ontologies(self):
-        query = '''
-            SELECT distinct ?ontology_uri ?title
-            {from_clause}
-            WHERE
-              {{
-                ?ontology_uri a owl:Ontology .
-                ?ontology_uri <http://purl.org/dc/elements/1.1/title> ?title
-              }}
-            '''
         error_msg = 'Graph not found'
-        response = self.query(None, query, error_msg)
-        if not response or len(response) == 0:
+        rows = self.query_rows(None, _Q_ONTOLOGIES, error_msg)
+        if not rows:
             raise Exception('No ontologies found for this endpoint')
-
-        # Response is a flat list; pack into tuples of (uri, ontology name)
-        ontologies = {}
-        n_ontologies = int(len(response) / 2)
-        for uri, ontology_name in zip(response[:n_ontologies], response[n_ontologies:]):
-            ontologies[uri] = ontology_name
-        return ontologies
+        return dict(rows)
 
     def is_instance(self, ontology: "Ontology", uri: str) -> bool:
-        query = f'''
-            SELECT distinct ?instance
-            {{from_clause}}
-            WHERE
-              {{{{
-                BIND(<{uri}> AS ?instance)
-                ?instance a owl:NamedIndividual .
-              }}}}
-            '''
         error_msg = ''
-        response = self.query(None, query, error_msg)
-        if not response or len(response) == 0:
-            return False
-        else:
-            return True
+        return bool(self._bound_query(None, _Q_IS_INSTANCE, error_msg, uri=uri))
 
     def get_instances(self, ontology: "Ontology", cls: "URI") -> bool:
-        query = f'''
-            SELECT distinct ?instance
-            {{from_clause}}
-            WHERE
-              {{{{
-                ?instance a owl:NamedIndividual .
-                ?instance a <{cls}> .
-              }}}}
-            '''
         error_msg = ''
-        instances = self.query(None, query, error_msg)
+        instances = self._bound_query(None, _Q_INSTANCES, error_msg, cls=cls)
         if not instances or len(instances) == 0:
             raise Exception(f'{cls} has no instances')
         else:
@@ -239,48 +1081,117 @@ class RESTEndpoint(QueryBackend, abc.ABC):
         """
         self.url = url
 
+    session = _create_session({'Accept': 'application/json'})
+    """HTTP session shared by all REST endpoints"""
+
     def _get_request(self, ontology: "Ontology", request: str):
-        response = requests.get(request)
+        response = self.session.get(request, timeout=TIMEOUT)
         if response.status_code == 200:
-            return response.json()
-        raise urllib.error.HTTPError(request, response.status_code, response.reason, response.headers, None)
+            return _parse_json(response)
+        if response.status_code == 404:
+            return None
+        raise _request_error(request, response)
 
 
 class SPARQLEndpoint(SPARQLBuilder, Endpoint):
     """Class which issues SPARQL queries to an endpoint
     """
 
+    session = _create_session({'Accept': 'application/sparql-results+json'})
+    """HTTP session shared by all SPARQL endpoints"""
+
     def __init__(self, url):
         """
         :param url: The SPARQL endpoint
         :url: str        
         """
         super().__init__(url)
-        self._endpoint = SPARQLWrapper(url)
-        self._endpoint.setReturnFormat(JSON)
 
     def query(self, ontology, sparql, err_msg):
-        """Issues SPARQL query
+        """Issues SPARQL query. Results of a query that selects a single variable are
+        requested as CSV, which is smaller than JSON and is read a line at a time
         """
-        self._endpoint.setQuery(sparql)
-        response = self._endpoint.query()
-        return self.convert(response)
+        sparql = sparql.replace(FROM_CLAUSE, self._from_clause(ontology))
+        if _SINGLE_VARIABLE_SELECT.match(sparql):
+            response = self._send(sparql, headers={'Accept': 'text/csv'})
+            if response.status_code == 200:
+                # SPARQL results are UTF-8, but without a charset in the response's
+                # Content-Type, requests would decode text/csv as ISO-8859-1
+                return self.convert_csv(response.content.decode('utf-8'))
+        else:
+            response = self._send(sparql)
+            if response.status_code == 200:
+                return self.convert(_parse_json(response))
+        raise _request_error(self.url, response)
+
+    def query_rows(self, ontology, sparql, err_msg):
+        """Issues SPARQL query, returning a tuple of the values of the query's variables
+        for each result. Results in which a variable is unbound are left out
+        """
+        sparql = sparql.replace(FROM_CLAUSE, self._from_clause(ontology))
+        response = self._send(sparql)
+        if response.status_code == 200:
+            return self.convert_rows(_parse_json(response))
+        raise _request_error(self.url, response)
+
+    max_get_length = 2000
+    """The longest query, in characters, sent in the URL of a GET request. Longer
+    queries, such as batches with large VALUES clauses, are POSTed instead"""
+
+    def _send(self, sparql, headers=None):
+        # GET requests are cached by the session, so they are preferred; but servers
+        # commonly reject URLs longer than a few kilobytes
+        if len(sparql) > self.max_get_length:
+            return self.session.post(self.url, data={'query': sparql}, headers=headers, timeout=TIMEOUT)
+        return self.session.get(self.url, params={'query': sparql}, headers=headers, timeout=TIMEOUT)
+
+    def _from_clause(self, ontology):
+        """The FROM clause restricting a query to the ontology's graph. By default, the
+        endpoint's default graph is queried
+        """
+        return ''
+
+    def convert_rows(self, response):
+        '''Converts standard SPARQL query JSON into a list of tuples, one per result.
+
+        See https://www.w3.org/TR/2013/REC-sparql11-results-json-20130321/
+        '''
+        variables = response['head']['vars']
+        return [tuple(sys.intern(binding[var]['value']) for var in variables)
+                for binding in response['results']['bindings'] if all(var in binding for var in variables)]
 
     def convert(self, response):
-        '''Converts standard SPARQL query JSON into a flat list.
+        '''Converts standard SPARQL query JSON into a flat list, or the answer to an ASK
+        query into a bool.
 
         See https://www.w3.org/TR/2013/REC-sparql11-results-json-20130321/
         '''
+        if response and 'boolean' in response:
+            return response['boolean']
         converted_response = []
         if response:
-            response = response.convert()  # Convert http response to JSON
-            var = response['head']['vars'][0]
             for var in response['head']['vars']:
                 for binding in response['results']['bindings']:
                     if var in binding:
-                        converted_response.append(binding[var]['value'])
+                        # URIs and labels repeat across cached results, so intern them
+                        # to share one copy
+                        converted_response.append(sys.intern(binding[var]['value']))
         return converted_response
 
+    def convert_csv(self, response):
+        '''Converts single-column SPARQL query CSV into a flat list, skipping the header
+        and unbound values.
+
+        See https://www.w3.org/TR/2013/REC-sparql11-results-csv-tsv-20130321/
+        '''
+        rows = csv.reader(StringIO(response))
+        next(rows, None)
+        return [sys.intern(row[0]) for row in rows if row and row[0]]
+
+
+_SESSION_OWNERS = (RESTEndpoint, SPARQLEndpoint)
+"""The classes whose HTTP session is shared by all their instances. See configure_connection_pools"""
+
 
 class GraphEndpoint(SPARQLBuilder, Endpoint):
     """Class for querying a local graph from a file
@@ -288,27 +1199,276 @@ class GraphEndpoint(SPARQLBuilder, Endpoint):
     def __init__(self, file_path):
         """
         """
-        self.graph = rdflib.Graph()
+        self._graph = None
         self.path = file_path
+        self._label_index = None
+        self._label_index_checked = False  # Set once load_label_index has looked for a cached index
+        self._hierarchy = None  # The superclasses of each class, built by _get_hierarchy on first use
+        self._ancestors = {}
+        self._hierarchy_lock = threading.Lock()
+        # Tracked separately, since the length of some rdflib stores is costly to compute
+        self._graph_loaded = False
+
+    @property
+    def graph(self):
+        """The rdflib Graph, which is only created once something uses it, since most
+        lookups are answered by endpoints or the label index instead
+        """
+        if self._graph is None:
+            self._graph = rdflib.Graph()
+        return self._graph
+
+    @graph.setter
+    def graph(self, graph):
+        self._graph = graph
 
     def is_loaded(self):
-        return bool(self.graph)
+        """Whether term lookups can be answered without parsing the ontology, i.e., whether
+        the label index or the graph is loaded. Other queries need the graph, see has_graph
+        """
+        return self._label_index is not None or self._graph_loaded
+
+    def has_graph(self):
+        """Whether the ontology has been parsed, so that any query can be answered without parsing it
+        """
+        return self._graph_loaded
+
+    def load_label_index(self):
+        """Loads the index of the ontology's labels cached by an earlier run, if there is
+        one, without parsing the ontology. The cache is only looked for once
+
+        :return: Whether the label index is loaded
+        :rtype: bool
+        """
+        if self._label_index is None and not self._label_index_checked:
+            self._label_index_checked = True
+            self._label_index = _read_pickle(self._cache_path('labels'))
+        return self._label_index is not None
 
     def load(self):
-        if self.path.split('.')[-1] == 'ttl':
-            self.graph.parse(self.path, format='ttl')
+        """Loads the ontology. If an index of the ontology's labels was cached by an
+        earlier run, only the index is loaded, since it is enough to answer term
+        lookups. The full graph is then loaded when a query needs it
+        """
+        self._label_index = _read_pickle(self._cache_path('labels'))
+        if self._label_index is None:
+            self._load_graph()
+
+    def _load_graph(self):
+        if _use_oxigraph():
+            # Oxigraph parses natively and its store is not picklable, so the
+            # graph cache is bypassed
+            graph = self._parse(rdflib.Graph(store='Oxigraph'))
         else:
-            self.graph.parse(self.path)
+            graph = _read_pickle(self._cache_path('graph'))
+            if graph is None:
+                graph = self._parse(rdflib.Graph())
+                _write_pickle(self._cache_path('graph'), graph)
+        self.graph = graph
+        self._graph_loaded = True
+        if self._label_index is None:
+            self._label_index = self._build_label_index()
+            _write_pickle(self._cache_path('labels'), self._label_index)
+
+    def _parse(self, graph):
+        # Choose the parser from the file extension, so that line-oriented formats
+        # like N-Triples don't go through the RDF/XML parser. Default to RDF/XML,
+        # since that is how .owl files are conventionally serialized
+        if self.path.endswith('.gz'):
+            # Gzipped ontologies are decompressed in memory, since parsers given a file
+            # object may reopen it by name. Relative URIs are still resolved against the
+            # location of the uncompressed file
+            file_name = self.path[:-len('.gz')]
+            with gzip.open(self.path, 'rb') as f:
+                source = {'data': f.read(), 'publicID': pathlib.Path(os.path.abspath(file_name)).as_uri()}
+        else:
+            file_name = self.path
+            source = {'source': self.path}
+        rdf_format = rdflib.util.guess_format(file_name) or 'xml'
+        if isinstance(graph.store, OxigraphStore) and rdf_format in OXIGRAPH_FORMATS:
+            # Oxigraph's own parsers stream the file straight into the store, instead
+            # of building every triple as rdflib terms first
+            graph.parse(**source, format=f'ox-{rdf_format}', transactional=False)
+        else:
+            graph.parse(**source, format=rdf_format)
+        return graph
+
+    def file_identity(self):
+        """Identifies the current contents of the source file by its location, size and
+        modification time, so that what is cached about the file is dropped when it changes
+        """
+        stat = os.stat(self.path)
+        return f'{os.path.realpath(self.path)}:{stat.st_size}:{stat.st_mtime_ns}'
+
+    def _cache_path(self, kind):
+        """Locates a pickled copy of the parsed graph or its label index. The cache is
+        keyed on the file_identity of the source file, as well as the rdflib version,
+        so a stale pickle is never loaded
+        """
+        key = f'{self.file_identity()}:{rdflib.__version__}'
+        digest = hashlib.sha1(key.encode()).hexdigest()[:16]
+        return cache_path('graphs', f'{os.path.basename(self.path)}.{digest}.{kind}.pickle')
+
+    def get_term_by_uri(self, ontology: "Ontology", uri: str):
+        """Reads the term's labels directly from the graph rather than evaluating
+        a SPARQL query. As with the SPARQL query, an English label is preferred
+
+        :param uri: The URI for the term
+        :uri: URI
+        :param ontology: The Ontology to query
+        :ontology: Ontology
+        """
+        if not self._graph_loaded:
+            self._load_graph()
+        labels = list(self.graph.objects(rdflib.URIRef(uri), rdflib.RDFS.label))
+        if not labels:
+            return None
+        for label in labels:
+            language = getattr(label, 'language', None)
+            if language and language.lower().startswith('en'):
+                return str(label)
+        return str(labels[0])
+
+    def get_uri_by_term(self, ontology: "Ontology", term: str) -> str:
+        """Looks up a term in an index of the graph's labels rather than evaluating
+        a SPARQL query. The index is built on first use.
+
+        :param term: The ontology term
+        :term: str
+        :param ontology: The ontology to query
+        :ontology: Ontology
+        """
+        if self._label_index is None:
+            self._load_graph()
+        candidates = self._label_index.get(_normalize_label(term))
+        if not candidates:
+            return None
+        return _resolve_label_matches(term, candidates)
+
+    concurrent_lookups = False
+
+    def get_uris_by_terms(self, ontology: "Ontology", terms: list) -> dict:
+        """Looks up several terms in the label index. Lookups in the index are cheap,
+        so the terms are simply looked up one at a time rather than with SPARQL or
+        concurrently
+
+        :param terms: The ontology terms
+        :terms: list
+        :param ontology: The ontology to query
+        :ontology: Ontology
+        """
+        return QueryBackend.get_uris_by_terms(self, ontology, terms)
+
+    def get_terms(self, ontology: "Ontology") -> list:
+        """Lists the URI and label of every term in the graph. Labels on blank nodes,
+        such as OWL axiom annotations, are not ontology terms and are skipped
+        """
+        if not self._graph_loaded:
+            self._load_graph()
+        return [(str(uri), str(label)) for uri, label in self.graph.subject_objects(rdflib.RDFS.label)
+                if isinstance(uri, rdflib.URIRef)]
+
+    def prefetch(self, ontology: "Ontology", uris: list) -> bool:
+        """Relation checks are answered from the class hierarchy, read once, so nothing
+        is fetched for particular terms
+        """
+        return True
+
+    def is_ancestor_of(self, ontology: "Ontology", ancestor_uri: str, descendant_uri: str) -> bool:
+        classes, _ = self._get_hierarchy()
+        return ancestor_uri in classes and ancestor_uri in self._get_ancestors(descendant_uri)
+
+    def is_descendant_of(self, ontology: "Ontology", descendant_uri: str, ancestor_uri: str) -> bool:
+        classes, _ = self._get_hierarchy()
+        return descendant_uri in classes and ancestor_uri in self._get_ancestors(descendant_uri)
+
+    def is_child_of(self, ontology: "Ontology", child_uri: str, parent_uri: str) -> bool:
+        classes, superclasses = self._get_hierarchy()
+        return child_uri in classes and parent_uri in superclasses.get(child_uri, ())
+
+    def is_parent_of(self, ontology: "Ontology", parent_uri: str, child_uri: str) -> bool:
+        return self.is_child_of(ontology, child_uri, parent_uri)
+
+    # Rather than querying for the parents or children of every term checked, or
+    # following rdfs:subClassOf* with a SPARQL property path, the graph's class
+    # hierarchy is read once, and the ancestors of each term are collected from it on
+    # first use. The results agree with _Q_PARENTS_BATCH, _Q_CHILDREN_BATCH, _Q_ANCESTORS
+    # and _Q_IS_DESCENDANT: a class is its own ancestor and descendant
+
+    def _get_hierarchy(self):
+        """Returns the set of the graph's classes, and the direct superclasses of each term
+        """
+        if self._hierarchy is None:
+            with self._hierarchy_lock:
+                if self._hierarchy is None:
+                    if not self._graph_loaded:
+                        self._load_graph()
+                    classes = frozenset(str(c) for c in self.graph.subjects(rdflib.RDF.type, rdflib.OWL.Class))
+                    # Blank nodes, e.g., OWL restrictions, are kept as nodes, so that the
+                    # hierarchy is followed through them but their ids never match a URI
+                    def node(term):
+                        return str(term) if isinstance(term, rdflib.URIRef) else term
+                    superclasses = {}
+                    for subclass, superclass in self.graph.subject_objects(rdflib.RDFS.subClassOf):
+                        superclasses.setdefault(node(subclass), set()).add(node(superclass))
+                    self._hierarchy = classes, superclasses
+        return self._hierarchy
+
+    def _get_ancestors(self, uri):
+        ancestors = self._ancestors.get(uri)
+        if ancestors is None:
+            _, superclasses = self._get_hierarchy()
+            found = {uri}
+            pending = [uri]
+            while pending:
+                for superclass in superclasses.get(pending.pop(), ()):
+                    if superclass not in found:
+                        found.add(superclass)
+                        pending.append(superclass)
+            ancestors = self._ancestors[uri] = frozenset(found)
+        return ancestors
+
+    def _build_label_index(self):
+        """Maps normalized labels to the (label, URI) pairs that share them
+        """
+        return _index_labels(self.get_terms(None))
+
+    def _bound_query(self, ontology, query, error_msg, **bindings):
+        """Rather than reparsing the query text for every URI, the query is parsed once
+        and the URIs are passed to it as initial bindings
+        """
+        if not self._graph_loaded:
+            self._load_graph()
+        prepared = _prepare_query(query.replace(FROM_CLAUSE, ''))
+        bindings = {rdflib.Variable(k): rdflib.URIRef(v) for k, v in bindings.items()}
+        response = self.graph.query(prepared, initBindings=bindings)
+        return self.convert(response)
 
     def query(self, ontology, sparql, err_msg):
-        sparql_final = sparql.format(from_clause='')  # Because only one ontology per file, delete the from clause
-        response = self.graph.query(sparql_final)
+        if not self._graph_loaded:
+            self._load_graph()
+        sparql_final = sparql.replace(FROM_CLAUSE, '')  # Because only one ontology per file, delete the from clause
+        response = self.graph.query(sparql_final, initNs=_QUERY_NAMESPACES)
         return self.convert(response)
 
+    def query_rows(self, ontology, sparql, err_msg):
+        """Queries the graph, returning a tuple of the values of the query's variables for
+        each result. Results in which a variable is unbound are left out
+        """
+        if not self._graph_loaded:
+            self._load_graph()
+        response = self.graph.query(sparql.replace(FROM_CLAUSE, ''), initNs=_QUERY_NAMESPACES)
+        return [tuple(sys.intern(str(value)) for value in row) for row in response if None not in row]
+
     def convert(self, response):
-        """Extracts and flattens queried variables from rdflib response into a list
+        """Extracts and flattens queried variables from rdflib response into a list, in the
+        same order as SPARQLEndpoint.convert, i.e., all values of the first variable, then
+        all values of the second, and so on. The answer to an ASK query is returned as a bool
         """
-        return [str(row[0]) for row in response]
+        if response.type == 'ASK':
+            return response.askAnswer
+        rows = list(response)
+        return [sys.intern(str(row[i])) for i in range(len(response.vars)) for row in rows if row[i] is not None]
 
 
 class OntobeeEndpoint(SPARQLEndpoint):
@@ -316,155 +1476,209 @@ class OntobeeEndpoint(SPARQLEndpoint):
     def __init__(self):
         super().__init__('http://sparql.hegroup.org/sparql/')
 
-    def query(self, ontology, sparql, err_msg):
+    def _from_clause(self, ontology):
+        return self._graph_from_clause(ontology.uri) if ontology else ''
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def _graph_from_clause(ontology_uri):
         # The general naming pattern for an Ontobee graph URI is to transform a PURL
         # http://purl.obolibrary.org/obo/$foo.owl (note foo must be all lowercase
         # by OBO conventions) to http://purl.obolibrary.org/obo/merged/uppercase($foo).
-        from_clause = ''
-        if ontology:
-            ontology_uri = ontology.uri
-            if 'http://purl.obolibrary.org/obo/' in ontology_uri:
-                ontology_uri = ontology_uri.replace('http://purl.obolibrary.org/obo/', '')
-                ontology_uri = ontology_uri.replace('.owl', '')
-                ontology_uri = ontology_uri.upper()
-                ontology_uri = 'http://purl.obolibrary.org/obo/merged/' + ontology_uri
-            from_clause = f'FROM <{ontology_uri}>'
-        sparql = sparql.format(from_clause=from_clause)
-        response = super().query(ontology, sparql, err_msg)
-        return response
+        if 'http://purl.obolibrary.org/obo/' in ontology_uri:
+            ontology_uri = ontology_uri.replace('http://purl.obolibrary.org/obo/', '')
+            ontology_uri = ontology_uri.replace('.owl', '')
+            ontology_uri = ontology_uri.upper()
+            ontology_uri = 'http://purl.obolibrary.org/obo/merged/' + ontology_uri
+        return f'FROM <{ontology_uri}>'
+
+
+# OLS request templates, filled in by EBIOntologyLookupServiceAPI._get_request
+_OLS_TERMS = '{url}/ontologies/{ontology}/terms?size={size}&page={page}'
+_OLS_RELATED_TERMS = '{url}/ontologies/{ontology}/{relation}?id={id}'
 
 
 class EBIOntologyLookupServiceAPI(RESTEndpoint):
 
+    page_size = 500
+    """The number of ontologies or terms requested per page, the most that OLS allows"""
+
     def __init__(self):
         super().__init__('http://www.ebi.ac.uk/ols/api')
-        self.ontology_short_ids = {}  # Set by the _load_ontology method
+        self.ontology_short_ids = {}  # Set by the _load_ontology_ids method
+        self._ids_lock = threading.Lock()
 
     def _load_ontology_ids(self):
-        response = requests.get(f'{self.url}/ontologies?size=1')
-        response = response.json()
-        total_ontologies = response['page']['totalElements']
-        response = requests.get(f'{self.url}/ontologies?size={total_ontologies}')
-        response = response.json()
-        for o in response['_embedded']['ontologies']:
-            short_id = o['ontologyId']
-            iri = o['config']['id']
-            self.ontology_short_ids[iri] = short_id
-
-    def _get_request(self, ontology: "Ontology", get_request: str):
+        # Rather than first asking for the number of ontologies and then requesting all
+        # of them, request them in large pages. Currently one page holds every ontology
+        # in OLS; should there be more, the remaining pages are fetched concurrently
+        def get_page(page):
+            return _parse_json(self.session.get(f'{self.url}/ontologies?size={self.page_size}&page={page}',
+                                                timeout=TIMEOUT))
+        response = get_page(0)
+        pages = [response] + self._map(get_page, range(1, response['page']['totalPages']))
+        ontology_short_ids = {}
+        for response in pages:
+            for o in response['_embedded']['ontologies']:
+                short_id = o['ontologyId']
+                iri = o['config']['id']
+                ontology_short_ids[iri] = short_id
+        # Assigned once complete, so other threads never see a partial index
+        self.ontology_short_ids = ontology_short_ids
+
+    def _get_ontology_ids(self):
+        """Returns the index of OLS's short ontology ids, e.g., ncbitaxon, by ontology URI.
+        The index is loaded once, by whichever thread needs it first, while any other
+        threads wait for it
+        """
         if not self.ontology_short_ids:
-            self._load_ontology_ids()
-        if ontology.uri not in self.ontology_short_ids:
-            raise LookupError(f'Ontology {ontology.uri} is not available at EBI Ontology Lookup Service')
-        short_id = self.ontology_short_ids[ontology.uri]
-        get_request = get_request.format(url=self.url, ontology=short_id)
+            with self._ids_lock:
+                if not self.ontology_short_ids:
+                    self._load_ontology_ids()
+        return self.ontology_short_ids
+
+    def _get_short_id(self, ontology: "Ontology"):
+        """Returns OLS's short id of the ontology, or None if OLS doesn't have the
+        ontology, in which case the methods below have no answer and the next back-end
+        is asked
+        """
+        return self._get_ontology_ids().get(ontology.uri)
+
+    def _get_request(self, ontology: "Ontology", get_request: str, **params):
+        short_id = self._get_short_id(ontology)
+        if short_id is None:
+            return None
+        get_request = get_request.format(url=self.url, ontology=short_id, **params)
         return super()._get_request(ontology, get_request)
 
     def get_term_by_uri(self, ontology: "Ontology", uri: str):
-        if not self.ontology_short_ids:
-            self._load_ontology_ids()
-        if ontology.uri not in self.ontology_short_ids:
-            raise LookupError(f'Ontology {ontology.uri} is not available at EBI Ontology Lookup Service')
-        short_id = self.ontology_short_ids[ontology.uri]
+        short_id = self._get_short_id(ontology)
+        if short_id is None:
+            return None
         get_query = f'{self.url}/ontologies/{short_id}/terms/' + urllib.parse.quote_plus(urllib.parse.quote_plus(uri))
-        response = requests.get(get_query)
+        response = self.session.get(get_query, timeout=TIMEOUT)
         if response.status_code == 200:
-            return response.json()['label']
+            return _parse_json(response)['label']
         if response.status_code == 404:
             return None
-        raise urllib.error.HTTPError(get_query, response.status_code, response.reason, response.headers, None)
+        raise _request_error(get_query, response)
 
     def get_uri_by_term(self, ontology: "Ontology", term: str):
-        if not self.ontology_short_ids:
-            self._load_ontology_ids()
-        if ontology.uri not in self.ontology_short_ids:
-            raise LookupError(f'Ontology {ontology.uri} is not available at EBI Ontology Lookup Service')
-        short_id = self.ontology_short_ids[ontology.uri]
-
+        short_id = self._get_short_id(ontology)
+        if short_id is None:
+            return None
         term = urllib.parse.quote_plus(term)
         get_query = f'{self.url}/search?q={term}&ontology={short_id}&queryFields=label'
-        response = requests.get(get_query)
+        response = self.session.get(get_query, timeout=TIMEOUT)
         if response.status_code == 200:
-            response = response.json()
+            response = _parse_json(response)
             if not response or not len(response['response']['docs']):
                 return None
             #if len(response['response']['docs']) > 1 and response['response']['docs'][0]['label'] == response['response']['docs'][1]['label']:
             #    raise Exception('Ambiguous term--more than one matching URI found')
             return response['response']['docs'][0]['iri']
-        raise urllib.error.HTTPError(get_query, response.status_code, response.reason, response.headers, None)
-
-    def get_parents(self, ontology: "Ontology", uri: str):
-        sanitized_uri = ontology._sanitize_uri(uri)
-        encoded_uri = urllib.parse.quote_plus(urllib.parse.quote_plus(sanitized_uri)) 
-        encoded_uri = urllib.parse.quote_plus(sanitized_uri)
+        raise _request_error(get_query, response)
 
-        request = '{url}/ontologies/{ontology}/parents?id=' + encoded_uri
-        response = self._get_request(ontology, request)
-        parents = []
+    def get_terms(self, ontology: "Ontology") -> list:
+        """Lists the URI and label of every term in the ontology. After the first page,
+        the remaining pages are fetched with up to max_workers requests in flight at once
+        """
+        def get_page(page):
+            return self._get_request(ontology, _OLS_TERMS, size=self.page_size, page=page)
+        response = get_page(0)
+        if response is None:
+            return None
+        pages = [response] + self._map(get_page, range(1, response['page']['totalPages']))
+        return [(term['iri'], term['label']) for response in pages
+                for term in response.get('_embedded', {}).get('terms', [])]
+
+    def _get_related_terms(self, ontology: "Ontology", relation: str, uri: str) -> frozenset:
+        """Fetches the terms related to a term, where relation is one of parents, children,
+        ancestors or descendants. The URIs are returned as a set, since callers mostly
+        test whether a URI is among them, or None if OLS doesn't have the ontology or the term
+        """
+        encoded_uri = urllib.parse.quote_plus(ontology._sanitize_uri(uri))
+        response = self._get_request(ontology, _OLS_RELATED_TERMS, relation=relation, id=encoded_uri)
+        if response is None:
+            return None
         if '_embedded' in response and 'terms' in response['_embedded']:
-             parents = [term['iri'] for term in response['_embedded']['terms']]
-             parents = [ontology._reverse_sanitize_uri(iri) for iri in parents]
-        return parents
+            return frozenset(sys.intern(ontology._reverse_sanitize_uri(term['iri']))
+                             for term in response['_embedded']['terms'])
+        return frozenset()
 
-    def get_children(self, ontology: "Ontology", uri: str):
-        sanitized_uri = ontology._sanitize_uri(uri)
-        encoded_uri = urllib.parse.quote_plus(urllib.parse.quote_plus(sanitized_uri)) 
-        encoded_uri = urllib.parse.quote_plus(sanitized_uri)
+    def get_parents(self, ontology: "Ontology", uri: str):
+        return self._get_related_terms(ontology, 'parents', uri)
 
-        request = '{url}/ontologies/{ontology}/children?id=' + encoded_uri
-        response = self._get_request(ontology, request)
-        children = []
-        if '_embedded' in response and 'terms' in response['_embedded']:
-             children = [term['iri'] for term in response['_embedded']['terms']]
-             children = [ontology._reverse_sanitize_uri(iri) for iri in children]
-        return children
+    def get_children(self, ontology: "Ontology", uri: str):
+        return self._get_related_terms(ontology, 'children', uri)
 
     def get_descendants(self, ontology: "Ontology", uri: str):
-        sanitized_uri = ontology._sanitize_uri(uri)
-        encoded_uri = urllib.parse.quote_plus(urllib.parse.quote_plus(sanitized_uri)) 
-        encoded_uri = urllib.parse.quote_plus(sanitized_uri)
-
-        request = '{url}/ontologies/{ontology}/descendants?id=' + encoded_uri
-        response = self._get_request(ontology, request)
-        descendants = []
-        if '_embedded' in response and 'terms' in response['_embedded']:
-             descendants = [term['iri'] for term in response['_embedded']['terms']]
-             descendants = [ontology._reverse_sanitize_uri(iri) for iri in descendants]
-        return descendants
+        return self._get_related_terms(ontology, 'descendants', uri)
 
     def get_ancestors(self, ontology: "Ontology", uri: str):
-        sanitized_uri = ontology._sanitize_uri(uri)
-        encoded_uri = urllib.parse.quote_plus(urllib.parse.quote_plus(sanitized_uri)) 
-        encoded_uri = urllib.parse.quote_plus(sanitized_uri)
+        return self._get_related_terms(ontology, 'ancestors', uri)
 
-        request = '{url}/ontologies/{ontology}/ancestors?id=' + encoded_uri
-        response = self._get_request(ontology, request)
-        descendants = []
-        if '_embedded' in response and 'terms' in response['_embedded']:
-             ancestors = [term['iri'] for term in response['_embedded']['terms']]
-             ancestors = [ontology._reverse_sanitize_uri(iri) for iri in ancestors]
-        return ancestors
+    def _get_related_terms_batch(self, ontology: "Ontology", relation: str, uris: list) -> dict:
+        related = self._map(lambda uri: self._get_related_terms(ontology, relation, uri), uris)
+        if any(related_uris is None for related_uris in related):
+            return None  # OLS doesn't have the ontology
+        return dict(zip(uris, related))
+
+    def get_parents_batch(self, ontology: "Ontology", uris: list) -> dict:
+        """Fetches the parents of several terms, with up to max_workers requests in flight at once
+
+        :return: A dictionary mapping each URI to the set of its parents' URIs
+        :rtype: dict
+        """
+        return self._get_related_terms_batch(ontology, 'parents', uris)
+
+    def get_children_batch(self, ontology: "Ontology", uris: list) -> dict:
+        """Fetches the children of several terms, with up to max_workers requests in flight at once
+
+        :return: A dictionary mapping each URI to the set of its children's URIs
+        :rtype: dict
+        """
+        return self._get_related_terms_batch(ontology, 'children', uris)
+
+    def get_descendants_batch(self, ontology: "Ontology", uris: list) -> dict:
+        """Fetches the descendants of several terms, with up to max_workers requests in flight at once
+
+        :return: A dictionary mapping each URI to the set of its descendants' URIs
+        :rtype: dict
+        """
+        return self._get_related_terms_batch(ontology, 'descendants', uris)
+
+    def get_ancestors_batch(self, ontology: "Ontology", uris: list) -> dict:
+        """Fetches the ancestors of several terms, with up to max_workers requests in flight at once
+
+        :return: A dictionary mapping each URI to the set of its ancestors' URIs
+        :rtype: dict
+        """
+        return self._get_related_terms_batch(ontology, 'ancestors', uris)
 
     def is_parent_of(self, ontology: "Ontology", parent_uri: str, child_uri: str) -> bool:
         parent_uri = ontology._reverse_sanitize_uri(parent_uri)
-        return parent_uri in self.get_parents(ontology, child_uri) 	
+        return self._contains(self.get_parents(ontology, child_uri), parent_uri)
 
     def is_child_of(self, ontology: "Ontology", child_uri: str, parent_uri: str) -> bool:
         child_uri = ontology._reverse_sanitize_uri(child_uri)
-        return child_uri in self.get_children(ontology, parent_uri)
+        return self._contains(self.get_children(ontology, parent_uri), child_uri)
 
     def is_descendant_of(self, ontology: "Ontology", descendant_uri: str, ancestor: str) -> bool:
         descendant_uri = ontology._reverse_sanitize_uri(descendant_uri)
-        return descendant_uri in self.get_descendants(ontology, ancestor) 	
+        return self._contains(self.get_descendants(ontology, ancestor), descendant_uri)
 
     def is_ancestor_of(self, ontology: "Ontology", ancestor_uri: str, descendant_uri: str) -> bool:
         ancestor_uri = ontology._reverse_sanitize_uri(ancestor_uri)
-        return ancestor_uri in self.get_ancestors(ontology, descendant_uri)
+        return self._contains(self.get_ancestors(ontology, descendant_uri), ancestor_uri)
+
+    @staticmethod
+    def _contains(related_uris, uri):
+        # None, for an ontology OLS doesn't have, leaves the check to the next back-end
+        return None if related_uris is None else uri in related_uris
 
     def get_ontologies(self):
-        if not self.ontology_short_ids:
-            self._load_ontology_ids()
-        return self.ontology_short_ids
+        return self._get_ontology_ids()
 
     def convert(self, response):
         pass
@@ -482,25 +1696,25 @@ class PUG_REST(RESTEndpoint):
             uri = uri.replace('https://identifiers.org/pubchem.substance:',
                               'https://pubchem.ncbi.nlm.nih.gov/rest/pug/substance/sid/')
         get_query = f'{uri}/synonyms/JSON'
-        response = requests.get(get_query)
+        response = self.session.get(get_query, timeout=TIMEOUT)
         if response.status_code == 200:
-            return response.json()['InformationList']['Information'][0]['Synonym'][0]
+            return _parse_json(response)['InformationList']['Information'][0]['Synonym'][0]
         if response.status_code == 404:
             return None
-        raise urllib.error.HTTPError(get_query, response.status_code, response.reason, response.headers, None)
+        raise _request_error(get_query, response)
 
     def get_uri_by_term(self, ontology: "Ontology", term: str):
         term = urllib.parse.quote(term)
         get_query = f'https://pubchem.ncbi.nlm.nih.gov/rest/pug/substance/name/{term}/sids/JSON'
-        response = requests.get(get_query)
+        response = self.session.get(get_query, timeout=TIMEOUT)
         if response.status_code == 200:
-            response = response.json()
+            response = _parse_json(response)
             if not response:
                 return None
             if len(response['IdentifierList']['SID']) > 1:
-                raise LookupError('Ambiguous term--more than one matching ID found')
+                raise AmbiguousTermError('Ambiguous term--more than one matching ID found')
             return f"https://identifiers.org/pubchem.substance:{response['IdentifierList']['SID'][0]}"
-        raise urllib.error.HTTPError(get_query, response.status_code, response.reason, response.headers, None)
+        raise _request_error(get_query, response)
 
 
 Ontobee = OntobeeEndpoint()
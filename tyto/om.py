@@ -1,10 +1,11 @@
-from .tyto import Ontology, Ontobee, installation_path
+from .tyto import Ontology, Ontobee, installation_path, make_replacer
 
 
-OM = Ontology(path=installation_path('ontologies/om-2.0.rdf'),
-              endpoints=None)
+OM = Ontology(path=installation_path('ontologies/om-2.0.rdf.gz'),
+              endpoints=None,
+              uri_prefixes=['http://www.ontology-of-units-of-measure.org/resource/om-2/'])
 """Ontology instance for Ontology of Units of Measure"""
 
 # Support American English spellings
-OM._sanitize_term = lambda term: term.replace('liter', 'litre').replace('meter', 'metre').replace('molar', 'molair').replace('_', ' ')
-OM._reverse_sanitize_term = lambda term: term.replace('litre', 'liter').replace('metre', 'meter').replace('molair', 'molar')
+OM._sanitize_term = make_replacer({'liter': 'litre', 'meter': 'metre', 'molar': 'molair', '_': ' '})
+OM._reverse_sanitize_term = make_replacer({'litre': 'liter', 'metre': 'meter', 'molair': 'molar'})
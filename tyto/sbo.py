@@ -1,16 +1,15 @@
-from .tyto import Ontology, Ontobee, installation_path, multi_replace
+from .tyto import Ontology, Ontobee, installation_path, make_replacer, replace_prefix
 
 
-SBO = Ontology(path=installation_path('ontologies/SBO_OWL.owl'),
+SBO = Ontology(path=installation_path('ontologies/SBO_OWL.owl.gz'),
                endpoints=[Ontobee],
-               uri='http://biomodels.net/SBO/')
+               uri='http://biomodels.net/SBO/',
+               uri_prefixes=['http://biomodels.net/SBO/'])
 """Ontology instance for Systems Biology Ontology"""
 
 
 # Translate URIs to and from identifiers.org namespace
-SBO._sanitize_uri = lambda uri: multi_replace(uri,
-                                              ['http://identifiers.org/sbo/SBO:',
-                                               'https://identifiers.org/SBO:'],
-                                              'http://biomodels.net/SBO/SBO_')
-SBO._reverse_sanitize_uri = lambda uri: uri.replace('http://biomodels.net/SBO/SBO_',
-                                                    'https://identifiers.org/SBO:')
+SBO._sanitize_uri = make_replacer({'http://identifiers.org/sbo/SBO:': 'http://biomodels.net/SBO/SBO_',
+                                   'https://identifiers.org/SBO:': 'http://biomodels.net/SBO/SBO_'})
+SBO._reverse_sanitize_uri = lambda uri: replace_prefix(uri, 'http://biomodels.net/SBO/SBO_',
+                                                            'https://identifiers.org/SBO:')
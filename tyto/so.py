@@ -1,17 +1,16 @@
-from .tyto import Ontology, Ontobee, installation_path, multi_replace
+from .tyto import Ontology, Ontobee, installation_path, make_replacer, replace_prefix
 
 
-SO = Ontology(path=installation_path('ontologies/so.owl'),
+SO = Ontology(path=installation_path('ontologies/so.owl.gz'),
               endpoints=[Ontobee],
-              uri='http://purl.obolibrary.org/obo/so.owl')
+              uri='http://purl.obolibrary.org/obo/so.owl',
+              uri_prefixes=['http://purl.obolibrary.org/obo/SO_', 'http://purl.obolibrary.org/obo/so#'])
 """Ontology instance for Sequence Ontology"""
 
 # Translate URIs to and from the identifiers.org namespace
-SO._sanitize_uri = lambda uri: multi_replace(uri,
-                                             ['https://identifiers.org/SO:',
-                                              'http://identifiers.org/so/SO:'],
-                                             'http://purl.obolibrary.org/obo/SO_')
-SO._reverse_sanitize_uri = lambda uri: uri.replace('http://purl.obolibrary.org/obo/SO_',
-                                                   'https://identifiers.org/SO:')
+SO._sanitize_uri = make_replacer({'https://identifiers.org/SO:': 'http://purl.obolibrary.org/obo/SO_',
+                                  'http://identifiers.org/so/SO:': 'http://purl.obolibrary.org/obo/SO_'})
+SO._reverse_sanitize_uri = lambda uri: replace_prefix(uri, 'http://purl.obolibrary.org/obo/SO_',
+                                                           'https://identifiers.org/SO:')
 
 SO._sanitize_term = lambda term: term
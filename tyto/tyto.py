@@ -1,13 +1,78 @@
+import json
 import os
+import re
 import logging
-from functools import lru_cache
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
 
-from .endpoint import Ontobee, EBIOntologyLookupService, GraphEndpoint, QueryBackend
+import urllib.error
+
+import requests
+
+from .endpoint import (Ontobee, EBIOntologyLookupService, GraphEndpoint, QueryBackend, SPARQLBuilder, TermIndex,
+                       AmbiguousTermError, LOOKUP_CACHE, configure_connection_pools, configure_disk_caches, lru_cached)
 
 
 LOGGER = logging.getLogger(__name__)
 logging.basicConfig(format='[%(levelname)s] %(filename)s %(lineno)d: %(message)s')
 
+# Resolved once, rather than every time an ontology module locates its file
+_PKG_DIR = os.path.dirname(os.path.realpath(__file__))
+
+
+_GRAPHS = weakref.WeakValueDictionary()
+"""The GraphEndpoint of each local ontology file in use, so that Ontology instances
+for the same file share one parsed graph. See _get_graph"""
+_GRAPHS_LOCK = threading.Lock()
+
+
+def _get_graph(path):
+    key = os.path.realpath(path)
+    with _GRAPHS_LOCK:
+        graph = _GRAPHS.get(key)
+        if graph is None:
+            graph = _GRAPHS[key] = GraphEndpoint(path)
+        return graph
+
+
+_UNREACHABLE_ENDPOINTS = {}
+"""The time.monotonic() time until which each endpoint that couldn't be reached is
+skipped. See Ontology._query_endpoints"""
+
+UNREACHABLE_BACKOFF = 30
+"""How long, in seconds, an unreachable endpoint is skipped before it is tried again"""
+
+_TRANSIENT = (requests.RequestException, urllib.error.URLError, json.JSONDecodeError, UnicodeDecodeError)
+"""The errors of an endpoint that fails to answer, e.g., a network error, a server error
+or a response that can't be decoded, such as a truncated one, after which the next
+endpoint is asked. orjson's decode error is a json.JSONDecodeError too. Other errors, e.g.,
+an AmbiguousTermError, a rejected request (EndpointRequestError) or a bug, reach the caller"""
+
+
+_ENDPOINT_EXECUTOR = None
+"""The thread pool that queries an ontology's endpoints at once, sized by
+configure_concurrency. See Ontology._query_endpoints"""
+_EXECUTOR_LOCK = threading.Lock()
+"""Held while queries are submitted to _ENDPOINT_EXECUTOR or it is replaced, so that a
+lookup never submits to a thread pool that configure_concurrency has shut down"""
+
+_UNANSWERED = object()
+"""Returned by Ontology._query_endpoints when no endpoint had an answer and at least one
+of them failed, as opposed to None, for when every endpoint queried found nothing"""
+
+
+class _UnansweredLookupError(LookupError):
+    """Raised for a lookup that found nothing after an endpoint failed to answer it. Unlike
+    other LookupErrors, it isn't cached, since the endpoint may answer the next time
+    """
+
+
+_LABEL_INDEX_METHODS = ('get_uri_by_term', 'get_uris_by_terms')
+"""The lookups that GraphEndpoint answers from its label index alone"""
+
 
 class Ontology():
 
@@ -21,30 +86,41 @@ class Ontology():
     :type endpoints: list, optional
     :param uri: The URI of the ontology
     :type str
+    :param uri_prefixes: The prefixes of the URIs that the ontology's endpoints are asked about, defaults to None,
+        in which case any URI may belong to the ontology. A local graph is asked about any URI
+    :type uri_prefixes: tuple, optional
     """
 
-    def __init__(self, path=None, endpoints=None, uri=None):
+    def __init__(self, path=None, endpoints=None, uri=None, uri_prefixes=None):
         if not path and not endpoints:
             raise Exception('A sparql endpoint or a local path to an ontology must be specified')
         self.graph = None
         self.endpoints = None
         self.uri = uri
+        self.uri_prefixes = tuple(uri_prefixes) if uri_prefixes else None
+        self._term_index = None  # Read by _get_term_index on first use
         if endpoints:
-            if not type(endpoints) is list or not all([issubclass(type(e), QueryBackend) for e in endpoints]):
+            if not isinstance(endpoints, list) or not all(isinstance(e, QueryBackend) for e in endpoints):
                 raise TypeError('The endpoints argument requires a list of Endpoints')
             self.endpoints = endpoints
         if path:
-            if not type(path) is str:
+            if not isinstance(path, str):
                 raise TypeError('Invalid path specified')
-            self.graph = GraphEndpoint(path)
+            self.graph = _get_graph(path)
 
     def __getattr__(self, name):
-        """Enables use of ontology terms as dynamic attributes, e.g., SO.promoter 
+        """Enables use of ontology terms as dynamic attributes, e.g., SO.promoter. The URI
+        is then stored on the instance, so later accesses bypass __getattr__ altogether
         """
-        if name in self.__getattribute__('__dict__'):
-            return self.__getattribute__(name)
-        else:
-            return self.__getattribute__('get_uri_by_term')(name)
+        # Python probes objects for special methods like __deepcopy__ and __length_hint__
+        # via getattr, and tools like IPython for private hooks like _repr_html_, none of
+        # which are ontology terms. Terms with a leading underscore can still be looked
+        # up with get_uri_by_term or SO['_term']
+        if name.startswith('_'):
+            raise AttributeError(name)
+        uri = self.get_uri_by_term(name)
+        self.__dict__[name] = uri
+        return uri
 
     def _handler(self, method_name, exception, *args):
         """Dispatches queries through Endpoints
@@ -53,48 +129,153 @@ class Ontology():
 
         # If the ontology graph has already been loaded locally, query that rather
         # than querying over the network
-        if self.graph and self.graph.is_loaded():
+        if self.graph and self._graph_ready(method_name):
             method = getattr(self.graph, method_name)
             response = method(self, *args)
             if response is not None:
                 return response
-            #try:
-            #    response = method(self, *args)
-            #    if response is not None:
-            #        return response
-            #except Exception as x:
-            #    LOGGER.error(x)
-
-        # Try endpoints
-        if self.endpoints:
-            for e in self.endpoints:
-                method = getattr(e, method_name)
-                response = method(self, *args)
-                if response is not None:
-                    return response
-                #try:
-                #    response = method(self, *args)
-                #    if response is not None:
-                #        return response
-                #except Exception as x:
-                #    LOGGER.error(x)
-                #    raise
+
+        # Term lookups only need the label index, so if an earlier run cached the index
+        # of a local ontology's labels, it is loaded for them, as it is much cheaper to
+        # load than the graph is to parse
+        elif self.graph and method_name in _LABEL_INDEX_METHODS:
+            try:
+                if self.graph.load_label_index():
+                    response = getattr(self.graph, method_name)(self, *args)
+                    if response is not None:
+                        return response
+            except AmbiguousTermError:
+                raise
+            except Exception as x:
+                LOGGER.error('%s failed to answer %s: %s', type(self.graph).__name__, method_name, x)
+
+        # Then try the snapshot of the ontology's terms, if one was saved by build_cache
+        term_index = self._get_term_index()
+        if term_index and hasattr(term_index, method_name):
+            response = getattr(term_index, method_name)(self, *args)
+            if response is not None:
+                return response
+
+        # Try endpoints. An endpoint that can't be reached, or that fails to answer,
+        # shouldn't prevent falling back to the next endpoint or the local graph
+        unanswered = False
+        if self.endpoints and not (method_name == 'get_term_by_uri' and self._is_foreign_uri(*args)):
+            response = self._query_endpoints(method_name, *args)
+            if response is _UNANSWERED:
+                unanswered = True
+            elif response is not None:
+                return response
 
         # If the connection fails or nothing found, fall back and load the ontology locally
-        if self.graph and not self.graph.is_loaded():
-            self.graph.load()
+        if self.graph and not self._graph_ready(method_name):
+            if not self.graph.is_loaded():
+                self.graph.load()
             method = getattr(self.graph, method_name)
             try:
                 response = method(self, *args)
                 if response is not None:
                     return response
+            except AmbiguousTermError:
+                raise
             except Exception as x:
-                LOGGER.error(x)
+                LOGGER.error('%s failed to answer %s: %s', type(self.graph).__name__, method_name, x)
 
         if exception:
+            if unanswered:
+                raise _UnansweredLookupError(f'{exception} (an endpoint failed to answer, so it will be asked again)')
             raise exception
         return None
 
+    def _graph_ready(self, method_name):
+        """Whether the local graph can answer a query without parsing the ontology. Term
+        lookups only need its label index, whereas other queries need the parsed graph
+        """
+        if method_name in _LABEL_INDEX_METHODS:
+            return self.graph.is_loaded()
+        return self.graph.has_graph()
+
+    def _query_endpoints(self, method_name, *args):
+        """Queries the endpoints in order, returning the first answer, or else None if
+        every endpoint found nothing, or _UNANSWERED if any of them failed. If concurrent
+        requests are allowed (see configure_concurrency), all of the endpoints are queried
+        at once, so that a slow or unreachable endpoint doesn't hold up the answer of the
+        next one. Answers are still taken in the order of the endpoints.
+
+        An endpoint that can't be connected to, or that times out, is skipped for
+        UNREACHABLE_BACKOFF seconds, rather than making every lookup wait on it. Transient
+        server errors are already retried by the endpoint's session
+        """
+        # Log messages are formatted only if they are emitted
+        def query(e):
+            if _UNREACHABLE_ENDPOINTS.get(e, 0) > time.monotonic():
+                return _UNANSWERED
+            try:
+                return getattr(e, method_name)(self, *args)
+            except (requests.ConnectionError, requests.Timeout) as x:
+                LOGGER.warning('%s is unreachable and will be skipped for %s seconds: %s',
+                               type(e).__name__, UNREACHABLE_BACKOFF, x)
+                _UNREACHABLE_ENDPOINTS[e] = time.monotonic() + UNREACHABLE_BACKOFF
+                return _UNANSWERED
+            except _TRANSIENT as x:
+                LOGGER.warning('%s failed to answer %s: %s', type(e).__name__, method_name, x)
+                return _UNANSWERED
+
+        def first_answer(responses):
+            failed = False
+            for response in responses:
+                if response is _UNANSWERED:
+                    failed = True
+                elif response is not None:
+                    return response
+            return _UNANSWERED if failed else None
+
+        with _EXECUTOR_LOCK:
+            executor = _ENDPOINT_EXECUTOR
+            # Requests to endpoints whose answers aren't needed are left to finish
+            if len(self.endpoints) > 1 and executor is not None:
+                futures = [executor.submit(query, e) for e in self.endpoints]
+        if len(self.endpoints) == 1 or executor is None:
+            return first_answer(query(e) for e in self.endpoints)
+        return first_answer(future.result() for future in futures)
+
+    def _lookup(self, method_name, exception, arg):
+        """Dispatches a term or URI lookup like _handler, but first checks for an answer to
+        the same lookup saved on disk by an earlier run. Answers found are saved in turn.
+        A term that wasn't found isn't saved, since the back-ends may just have been
+        unreachable
+        """
+        key = self._lookup_key(method_name, arg)
+        if key is None:
+            return self._handler(method_name, exception, arg)
+        response = LOOKUP_CACHE.get(key)
+        if response is None:
+            response = self._handler(method_name, exception, arg)
+            if response is not None:
+                LOOKUP_CACHE[key] = str(response)
+        return response
+
+    def _lookup_key(self, method_name, arg):
+        """Returns the key under which a lookup is saved in LOOKUP_CACHE, or None if it isn't saved
+        """
+        # Ontologies are told apart by their URI, so lookups in one without a URI aren't saved.
+        # The answers of a local graph depend on its file, so they are also keyed on that
+        # file's current version, and aren't reused once it changes or for another file
+        if not self.uri or os.environ.get('TYTO_LOOKUP_CACHE', '1') == '0':
+            return None
+        if not self.graph:
+            return f'{method_name} {self.uri} {arg}'
+        try:
+            return f'{method_name} {self.uri} {self.graph.file_identity()} {arg}'
+        except OSError:
+            return None
+
+    def _save_lookup(self, method_name, arg, response):
+        """Saves the answer to a lookup found other than by _lookup, e.g., by a batch query
+        """
+        key = self._lookup_key(method_name, arg)
+        if key is not None:
+            LOOKUP_CACHE[key] = str(response)
+
     def get_term_by_uri(self, uri):
         """Provides the ontology term (rdfs:label) associated with the given URI.
 
@@ -106,9 +287,16 @@ class Ontology():
     """
         sanitized_uri = self._sanitize_uri(uri)
         exception = LookupError(f'No matching term found for {uri}')
-        term = self._handler('get_term_by_uri', exception, sanitized_uri)
+        # Endpoints aren't asked about a URI that can't belong to this ontology, so without
+        # a local graph, which may still label it, there is nothing to ask
+        if not self.graph and self._is_foreign_uri(sanitized_uri):
+            raise exception
+        term = self._lookup('get_term_by_uri', exception, sanitized_uri)
         return Term(self._reverse_sanitize_term(term), sanitized_uri, self)
 
+    def _is_foreign_uri(self, uri):
+        return bool(self.uri_prefixes) and not uri.startswith(self.uri_prefixes)
+
     def get_uri_by_term(self, term):
         """Provides the URI associated with the given ontology term (rdfs:label).  The __getattr__ and __getitem__ methods delegate to this method. 
 
@@ -120,9 +308,101 @@ class Ontology():
         """
         sanitized_term = self._sanitize_term(term)
         exception = LookupError(f'{term} is not a valid ontology term')
-        uri = self._handler('get_uri_by_term', exception, sanitized_term)
+        uri = self._lookup('get_uri_by_term', exception, sanitized_term)
         return URI(self._reverse_sanitize_uri(uri), self)
 
+    def get_uris_by_terms(self, terms):
+        """Provides the URIs associated with several ontology terms. Where the back-end
+        supports it, the terms are resolved with a single query rather than one query per term,
+        which matches the exact spellings of each term's label. Terms the batch doesn't
+        resolve are then looked up individually, like get_uri_by_term.
+
+        :param terms: ontology terms
+        :type terms: list
+
+        :return: A dictionary mapping each term that was found to its URI. Terms which are not found are omitted
+        :rtype: dict
+        """
+        # Terms already looked up are answered from the cache of get_uri_by_term, and the
+        # URIs found by the batch query are added to it
+        uris = {}
+        pending = []
+        for term in terms:
+            cached = Ontology.get_uri_by_term.peek(self, term)
+            if cached is _NOT_CACHED:
+                pending.append(term)
+            elif cached is not None:
+                uris[term] = cached
+        if pending:
+            sanitized_terms = [self._sanitize_term(term) for term in pending]
+            failed = False
+            try:
+                response = self._handler('get_uris_by_terms', LookupError('None of the terms were found'),
+                                         sanitized_terms)
+            except _UnansweredLookupError:
+                # Looking the terms up one at a time would fail the same way
+                response, failed = {}, True
+            except LookupError:
+                response = {}
+            for term, sanitized_term in zip(pending, sanitized_terms):
+                if sanitized_term in response:
+                    uris[term] = URI(self._reverse_sanitize_uri(response[sanitized_term]), self)
+                    Ontology.get_uri_by_term.seed(self, term, uris[term])
+                    continue
+                if failed:
+                    continue
+                # Fall back to looking up the term individually, in case another back-end has it
+                try:
+                    uris[term] = self.get_uri_by_term(term)
+                except LookupError:
+                    pass
+        return {term: uris[term] for term in terms if term in uris}
+
+    def prefetch(self, uris):
+        """Fetches the parents and children of several terms at once, with a single query
+        each where the back-end supports it, so that later relation checks on these terms,
+        such as is_child_of and is_parent_of, are answered without further queries. This is
+        only an optimization, so only the endpoints are asked, and a local ontology isn't
+        parsed for it
+
+        :param uris: URIs of ontology terms
+        :type uris: list
+        """
+        # A parsed local graph answers relation checks from its class hierarchy, without queries
+        if not self.endpoints or (self.graph and self.graph.has_graph()):
+            return
+        sanitized_uris = [self._sanitize_uri(uri) for uri in uris]
+        self._query_endpoints('prefetch', sanitized_uris)
+
+    def build_cache(self):
+        """Saves a snapshot of every term in the ontology and its URI in the user's tyto
+        cache, so that later lookups of these terms, including in other processes, are
+        answered without querying an endpoint. The terms are listed by the local graph,
+        if there is one, or else the first endpoint able to list them. This can also be
+        done from the command line, e.g., python -m tyto build-cache NCIT
+
+        :return: The number of terms saved
+        :rtype: int
+        """
+        if not self.uri:
+            raise ValueError('Only an ontology with a URI can be cached')
+        backends = ([self.graph] if self.graph else []) + (self.endpoints or [])
+        for backend in backends:
+            terms = backend.get_terms(self)
+            if terms:
+                break
+        else:
+            raise LookupError(f'None of the back-ends for {self.uri} can list its terms')
+        self._term_index = TermIndex(terms)
+        self._term_index.save(self)
+        return len(self._term_index)
+
+    def _get_term_index(self):
+        if self._term_index is None:
+            # False marks that no snapshot was saved, so the cache isn't checked again
+            self._term_index = (TermIndex.load(self) if self.uri else None) or False
+        return self._term_index
+
     def _sanitize_uri(self, uri):
         """Some Ontology instances may override this method to translate a URI
         from purl to identifiers.org namespaces
@@ -163,6 +443,9 @@ class URI(str):
     :type ontology: Ontology
     """
 
+    # URIs are returned in large numbers, so they don't carry an instance dictionary
+    __slots__ = ('ontology',)
+
     def __new__(cls, value: str, ontology: Ontology):
         term = str.__new__(cls, value)
         term.ontology = ontology
@@ -267,6 +550,8 @@ class URI(str):
 
 class Term(str):
 
+    __slots__ = ('uri', 'ontology')
+
     def __new__(cls, value, uri, ontology):
         term = super().__new__(cls, value)
         term.uri = uri
@@ -279,8 +564,16 @@ class Term(str):
 
 # Utility functions
 def installation_path(relative_path):
-    return os.path.join(os.path.dirname(os.path.realpath(__file__)),
-                        relative_path)
+    return os.path.join(_PKG_DIR, *relative_path.split('/'))
+
+
+def replace_prefix(target_uri, old_prefix, new_prefix):
+    """Translates a URI from one namespace to another. Unlike str.replace, only the
+    start of the URI is examined
+    """
+    if target_uri.startswith(old_prefix):
+        return new_prefix + target_uri[len(old_prefix):]
+    return target_uri
 
 
 def multi_replace(target_uri, old_namespaces, new_namespace):
@@ -290,20 +583,179 @@ def multi_replace(target_uri, old_namespaces, new_namespace):
     return target_uri
 
 
+def make_replacer(replacements):
+    """Builds a function that makes all of the given replacements in a single pass over
+    a string, instead of one str.replace per pair. Where candidates overlap, the
+    earliest listed wins
+
+    :param replacements: Maps each substring to its replacement
+    :type replacements: dict
+    """
+    pattern = re.compile('|'.join(re.escape(old) for old in replacements))
+    return lambda s: pattern.sub(lambda m: replacements[m.group(0)], s)
+
+
+def configure_concurrency(max_workers=1):
+    """Set how many requests a batch lookup, such as Ontology.get_uris_by_terms, may send
+    to an endpoint at once. By default, requests are sent one at a time, so as not to
+    overload public services. With more than one worker, an ontology with several
+    endpoints also queries them all at once, rather than one after another
+
+    :param max_workers: The maximum number of concurrent requests per batch
+    :type max_workers: int
+    """
+    global _ENDPOINT_EXECUTOR
+    if max_workers < 1:
+        raise ValueError('max_workers must be at least 1')
+    QueryBackend.max_workers = max_workers
+    with _EXECUTOR_LOCK:
+        previous = _ENDPOINT_EXECUTOR
+        _ENDPOINT_EXECUTOR = ThreadPoolExecutor(max_workers=max_workers) if max_workers > 1 else None
+    if previous is not None:
+        # Queries already submitted to the previous pool are left to finish
+        previous.shutdown(wait=False)
+    # Keep a live connection for every request that may be in flight
+    configure_connection_pools(max(max_workers, 16))
+
+
+def warm_cache(ontology, terms):
+    """Looks up several terms in the background, with a single batch query where the
+    back-end supports it, so that later lookups of these terms are answered from the
+    in-memory cache. This hides the latency of the first queries
+    to an endpoint, e.g., behind the rest of a program's start-up. At import, tyto warms
+    the cache with the terms listed in the JSON file named by the TYTO_WARM environment
+    variable, e.g., {"SO": ["promoter", "CDS"]}
+
+    :param ontology: The ontology of the terms
+    :type ontology: Ontology
+    :param terms: ontology terms
+    :type terms: list
+    :return: The thread looking up the terms, which may be joined to wait for the lookups
+    :rtype: threading.Thread
+    """
+    def look_up():
+        # get_uris_by_terms caches what it finds for get_uri_by_term. Terms the batch
+        # doesn't find were already looked up individually, and are cache hits below
+        try:
+            uris = ontology.get_uris_by_terms(terms)
+        except Exception as x:
+            LOGGER.warning(f'Failed to warm the cache with a batch query: {x}')
+            uris = {}
+        for term in terms:
+            if term in uris:
+                continue
+            try:
+                ontology.get_uri_by_term(term)
+            except LookupError:
+                pass  # The miss is cached too, unless an endpoint failed to answer
+            except Exception as x:
+                LOGGER.warning(f'Failed to warm the cache with {term}: {x}')
+    # A daemon thread, so a slow endpoint can't delay the interpreter's exit
+    thread = threading.Thread(target=look_up, name='tyto-warm-cache', daemon=True)
+    thread.start()
+    return thread
+
+
+_NOT_CACHED = object()
+"""Returned by the peek method of a _memoize wrapper for a call that isn't cached"""
+
+
+def _memoize(method, save=None):
+    """Wraps an Ontology lookup method in an LRU cache. A LookupError is cached like any
+    other result, so probing for a missing term repeatedly doesn't re-query the endpoints.
+    A lookup that an endpoint failed to answer isn't cached, so it is retried next time.
+
+    Besides the methods of functools.lru_cache, the wrapper has a peek method, which
+    returns the cached result of a call, None if the call raised a LookupError, or
+    _NOT_CACHED, and a seed method, which caches the result of a call found by other
+    means, e.g., a batch query. The result is also passed to save, if given, with the
+    Ontology and argument of the call
+    """
+    @lru_cached()
+    def cached(*args, **kwargs):
+        try:
+            return method(*args, **kwargs), None
+        except _UnansweredLookupError:
+            raise
+        except LookupError as x:
+            return None, x
+
+    @wraps(method)
+    def wrapper(*args, **kwargs):
+        result, exception = cached(*args, **kwargs)
+        if exception is not None:
+            raise exception.with_traceback(None)
+        return result
+
+    def peek(ontology, arg):
+        result, exception = cached.cache.get((ontology, arg), (_NOT_CACHED, None))
+        return None if exception is not None else result
+
+    def seed(ontology, arg, result):
+        cached.cache[(ontology, arg)] = (result, None)
+        if save is not None:
+            save(ontology, arg, result)
+
+    wrapper.cache = cached.cache
+    wrapper.cache_info = cached.cache_info
+    wrapper.cache_clear = cached.cache_clear
+    wrapper.peek = peek
+    wrapper.seed = seed
+    return wrapper
+
+
+Ontology.get_term_by_uri = _memoize(Ontology.get_term_by_uri)
+# URIs are saved as the back-ends return them, as _lookup saves them, i.e., before
+# _reverse_sanitize_uri, which _sanitize_uri undoes
+Ontology.get_uri_by_term = _memoize(Ontology.get_uri_by_term,
+                                    save=lambda ontology, term, uri: ontology._save_lookup(
+                                        'get_uri_by_term', ontology._sanitize_term(term), ontology._sanitize_uri(uri)))
+
+
 def configure_cache_size(maxsize=1000):
-    """Set the size of the in-memory cache in order to optimize performance and frequency of queries over the network
+    """Set the size of the in-memory cache in order to optimize performance and frequency of queries over the network.
+    The size may be changed at any time. Cached results are kept, except for the least recently used ones that no
+    longer fit
 
-    :param maxsize: The maximum number of cached query results
+    :param maxsize: The maximum number of cached query results, or None for no limit
     :type maxsize: int
     """
-    if not '__wrapped__' in Ontology.get_term_by_uri.__dict__:
-        # Initialize cache
-        Ontology.get_term_by_uri = lru_cache(maxsize=maxsize)(Ontology.get_term_by_uri)
-        Ontology.get_uri_by_term = lru_cache(maxsize=maxsize)(Ontology.get_uri_by_term)
-    else:
-        # Reset cache-size if it was previously set
-        Ontology.get_term_by_uri = lru_cache(maxsize=maxsize)(Ontology.get_term_by_uri.__wrapped__)
-        Ontology.get_uri_by_term = lru_cache(maxsize=maxsize)(Ontology.get_uri_by_term.__wrapped__)
-
-# Initialize cache
-configure_cache_size()
+    Ontology.get_term_by_uri.cache.resize(maxsize)
+    Ontology.get_uri_by_term.cache.resize(maxsize)
+    for name in SPARQLBuilder.cached_queries:
+        getattr(SPARQLBuilder, name).cache.resize(maxsize)
+    SPARQLBuilder.relation_cache.resize(maxsize)
+
+
+def configure_disk_cache(path=None, ttl=7 * 24 * 60 * 60):
+    """Set where the caches kept from one run to the next are stored, and how long the lookups and HTTP responses
+    saved in them are reused. These caches hold the terms and URIs found by lookups, the responses of endpoints,
+    and the parsed local ontologies. Set TYTO_LOOKUP_CACHE=0 or TYTO_HTTP_CACHE=0 to disable them
+
+    :param path: The cache directory, defaults to None, in which case the TYTO_CACHE_DIR environment variable
+        or else ~/.cache/tyto is used
+    :type path: str, optional
+    :param ttl: The number of seconds a cached lookup or response is reused, defaults to a week
+    :type ttl: float, optional
+    """
+    if ttl <= 0:
+        raise ValueError('ttl must be positive')
+    configure_disk_caches(os.fspath(path) if path is not None else None, ttl)
+
+
+def cache_stats():
+    """Reports how often each in-memory cache answered a lookup. The caches of Ontology
+    lookups hold whole results for a term or URI, while the caches of SPARQL queries
+    hold the results from which those are drawn, e.g., all labels matching a term or
+    the set of a term's children
+
+    :return: A dictionary mapping the name of each cache to its hits, misses, maximum size and current size
+    :rtype: dict
+    """
+    stats = {'get_term_by_uri': Ontology.get_term_by_uri.cache_info(),
+             'get_uri_by_term': Ontology.get_uri_by_term.cache_info()}
+    for name in SPARQLBuilder.cached_queries:
+        stats[name.lstrip('_')] = getattr(SPARQLBuilder, name).cache_info()
+    stats['relations'] = SPARQLBuilder.relation_cache.cache_info()
+    return stats
+